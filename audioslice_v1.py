@@ -1,7 +1,7 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from spleeter.separator import Separator
+from separator_pool import get_pool
 from pydub import AudioSegment
 from pydub.playback import _play_with_simpleaudio
 import threading
@@ -74,8 +74,7 @@ class AudioMixerApp:
             convert_mp3_to_wav(self.input_audio_mp3, self.input_audio_wav)
 
             # Separate stems using Spleeter
-            separator = Separator('spleeter:2stems')
-            separator.separate_to_file(self.input_audio_wav, self.output_directory)
+            get_pool().separate_to_file(self.input_audio_wav, self.output_directory, model='spleeter:2stems')
 
             # After separation, assign paths to vocals and accompaniment
             separated_dir = os.path.join(self.output_directory, base_name)
@@ -1,14 +1,11 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from spleeter.separator import Separator
+from separator_pool import get_pool
 import pygame
 import threading
 import time
 
-# Initialize Pygame mixer
-pygame.mixer.init()
-
 
 def convert_mp3_to_wav(mp3_file, output_wav_file):
     from pydub import AudioSegment
@@ -92,8 +89,7 @@ class AudioMixerApp:
             convert_mp3_to_wav(file_path, wav_path)
 
             # Separate stems using Spleeter
-            separator = Separator('spleeter:2stems')
-            separator.separate_to_file(wav_path, output_directory)
+            get_pool().separate_to_file(wav_path, output_directory, model='spleeter:2stems')
 
             # Assign paths
             self.vocals_path = os.path.join(output_directory, base_name, "vocals.wav")
@@ -1,47 +1,103 @@
+import time
+# Measured from here to the window first being shown
+STARTUP_START = time.perf_counter()
+
+import logging
 import os
+import queue
+import threading
+import traceback
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from spleeter.separator import Separator
-import pygame
-import threading
-import time
-from pydub import AudioSegment
-
-pygame.mixer.init()
-
-def convert_mp3_to_wav(mp3_file, output_wav_file):
-    audio = AudioSegment.from_file(mp3_file)
-    audio.export(output_wav_file, format="wav")
-    return output_wav_file
+import numpy as np
+from jobs import SliceJobQueue, POLL_INTERVAL_MS
+from library import get_library
+from mix_engine import MixEngine, fader_gain
+from peaks import PeakIndex
+from remix import render_mix, CODECS
+from separation_service import service_client
+from stretch import StretchCache, StretchedStem
+from stem_io import open_stem, find_stems, stem_model
+
+logger = logging.getLogger("audioslicer.player")
+
+# Small device buffer so a seek is audible quickly
+MIXER_BUFFER = 512
+SEEK_BUDGET_MS = 50
+POSITION_FPS = 20
+LIBRARY_RESCAN_MS = 30000
+WAVEFORM_WIDTH = 600
+WAVEFORM_HEIGHT = 60
+ZOOM_STEP = 1.25
+# Rendered audio needed past the playhead before playback resumes at a new speed
+STRETCH_LEAD_SECONDS = 2.0
+
+MODELS = {
+    "2 stems": 'spleeter:2stems',
+    "4 stems": 'spleeter:4stems',
+    "5 stems": 'spleeter:5stems',
+}
+
+# How a volume slider's position maps to gain
+VOLUME_LAWS = {
+    "Linear": "linear",
+    "dB": "db",
+}
 
 class AudioMixerApp:
-    def __init__(self, master):
+    def __init__(self, master, position_fps=POSITION_FPS):
         self.master = master
         master.title("Audio Mixer")
 
         # Variables
-        self.vocals_path = None
-        self.accompaniment_path = None
-        self.vocals_volume = tk.DoubleVar(value=1.0)
-        self.accompaniment_volume = tk.DoubleVar(value=1.0)
+        self.stem_paths = {}
+        self.stem_volumes = {}
+        self.model_name = tk.StringVar(value="2 stems")
+        self.volume_law = tk.StringVar(value="Linear")
         self.track_position = tk.DoubleVar(value=0)
         self.track_length = 0
+        self.track_frames = 0
         self.is_playing = False
         self.is_paused = False
 
-        # Manual position tracking
-        self.current_offset = 0.0
-        self.play_start_time = 0.0
-
-        # Audio segments (loaded once we have paths)
-        self.vocals_segment = None
-        self.accompaniment_segment = None
+        # 16-bit sample arrays, one per stem (loaded once we have paths)
+        self.stem_samples = None
+        self.sample_rate = 44100
+
+        # Single output stream; its sample counter is the playback position
+        self.engine = MixEngine(block_size=MIXER_BUFFER)
+        self.position_fps = position_fps
+        self.position_clock = None
+
+        # Peak indexes for the waveform, built off the main thread; view is a (start, end) frame range
+        self.peaks = None
+        self.peaks_results = queue.Queue()
+        self.peaks_poll = None
+        self.view = (0, 0)
+        # A/B loop points in seconds, None until set
+        self.loop_points = [None, None]
+
+        # Tempo and pitch; stretched renders are kept per stem and setting for quick switching
+        self.speed_percent = tk.IntVar(value=100)
+        self.semitones = tk.IntVar(value=0)
+        self.stretch = (1.0, 0.0)
+        self.stretch_cache = StretchCache()
+        self.stretch_poll = None
+        self.stretch_resume = False
+
+        # Indexed sliced tracks; the roots are rescanned in the background every LIBRARY_RESCAN_MS
+        self.library = get_library()
+        self.library_tracks = []
+        self.library_scan = None
+        self.library_rescan = None
+        self.library_scan_again = False
 
         self.create_gui()
+        self.show_library()
+        self.scan_library()
 
-        # Timer for updating seek slider
-        self.update_timer = threading.Thread(target=self.update_seek_slider, daemon=True)
-        self.update_timer.start()
+        # Slicing runs in the background so the window stays responsive
+        self.job_queue = SliceJobQueue(self.master, self.update_job, client=service_client())
 
     def create_gui(self):
         controls_frame = tk.Frame(self.master)
@@ -62,173 +118,522 @@ class AudioMixerApp:
         self.stop_button = tk.Button(controls_frame, text="Stop", command=self.stop_audio, state="disabled")
         self.stop_button.grid(row=0, column=4, padx=10)
 
-        mixer_frame = tk.Frame(self.master)
-        mixer_frame.grid(row=1, column=0, columnspan=4, pady=10)
+        self.model_menu = tk.OptionMenu(controls_frame, self.model_name, *MODELS)
+        self.model_menu.grid(row=0, column=5, padx=10)
+
+        self.volume_law_menu = tk.OptionMenu(controls_frame, self.volume_law, *VOLUME_LAWS, command=self.update_volume)
+        self.volume_law_menu.grid(row=0, column=6, padx=10)
 
-        vocals_frame = tk.Frame(mixer_frame)
-        vocals_frame.pack(side="left", padx=20)
-        tk.Label(vocals_frame, text="Vocals Volume").pack()
-        self.vocals_slider = ttk.Scale(vocals_frame, from_=1.0, to=0.0, variable=self.vocals_volume, orient="vertical", command=self.update_volume)
-        self.vocals_slider.pack()
+        self.export_button = tk.Button(controls_frame, text="Export Mix", command=self.export_mix, state="disabled")
+        self.export_button.grid(row=0, column=7, padx=10)
 
-        accompaniment_frame = tk.Frame(mixer_frame)
-        accompaniment_frame.pack(side="left", padx=20)
-        tk.Label(accompaniment_frame, text="Accompaniment Volume").pack()
-        self.accompaniment_slider = ttk.Scale(accompaniment_frame, from_=1.0, to=0.0, variable=self.accompaniment_volume, orient="vertical", command=self.update_volume)
-        self.accompaniment_slider.pack()
+        # One volume slider per stem, built when stems are loaded
+        self.mixer_frame = tk.Frame(self.master)
+        self.mixer_frame.grid(row=1, column=0, columnspan=4, pady=10)
 
         seek_frame = tk.Frame(self.master)
         seek_frame.grid(row=2, column=0, columnspan=4, pady=10)
+        self.waveform = tk.Canvas(seek_frame, width=WAVEFORM_WIDTH, height=WAVEFORM_HEIGHT, background="white", highlightthickness=0)
+        self.waveform.pack(fill="x", padx=20)
+        self.waveform.create_line(0, 0, 0, 0, fill="red", tags="playhead")
+        self.waveform.bind("<Configure>", lambda event: self.draw_waveform())
+        self.waveform.bind("<Button-1>", self.waveform_click)
+        self.waveform.bind("<MouseWheel>", self.zoom_waveform)
+        self.waveform.bind("<Button-4>", self.zoom_waveform)
+        self.waveform.bind("<Button-5>", self.zoom_waveform)
         self.seek_slider = ttk.Scale(seek_frame, from_=0, to=100, variable=self.track_position, orient="horizontal", command=self.seek_audio)
         self.seek_slider.pack(fill="x", padx=20)
 
-    def slice_track(self):
-        file_path = filedialog.askopenfilename(filetypes=[("MP3 files", "*.mp3")])
-        if file_path:
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_directory = os.path.join(os.getcwd(), base_name)
-            os.makedirs(output_directory, exist_ok=True)
-
-            wav_path = os.path.join(output_directory, f"{base_name}.wav")
-            convert_mp3_to_wav(file_path, wav_path)
+        loop_frame = tk.Frame(seek_frame)
+        loop_frame.pack(pady=(5, 0))
+        tk.Button(loop_frame, text="Set A", command=lambda: self.set_loop_point(0)).pack(side="left", padx=5)
+        tk.Button(loop_frame, text="Set B", command=lambda: self.set_loop_point(1)).pack(side="left", padx=5)
+        tk.Button(loop_frame, text="Clear Loop", command=self.clear_loop).pack(side="left", padx=5)
+
+        tk.Label(loop_frame, text="Speed %").pack(side="left", padx=(20, 5))
+        speed_scale = tk.Scale(loop_frame, from_=50, to=150, resolution=5, orient="horizontal", variable=self.speed_percent)
+        speed_scale.pack(side="left")
+        # Only render once the slider is let go, not for every value it passes through
+        speed_scale.bind("<ButtonRelease-1>", self.change_stretch)
+        tk.Label(loop_frame, text="Pitch").pack(side="left", padx=(20, 5))
+        pitch_box = tk.Spinbox(loop_frame, from_=-12, to=12, width=4, textvariable=self.semitones, command=self.change_stretch)
+        pitch_box.pack(side="left")
+        pitch_box.bind("<Return>", self.change_stretch)
+
+        jobs_frame = tk.Frame(self.master)
+        jobs_frame.grid(row=3, column=0, columnspan=4, pady=10)
+        self.jobs_list = tk.Listbox(jobs_frame, width=60, height=4)
+        self.jobs_list.pack(side="left", padx=(20, 0))
+        self.cancel_job_button = tk.Button(jobs_frame, text="Cancel", command=self.cancel_job)
+        self.cancel_job_button.pack(side="left", padx=10)
+
+        library_frame = tk.Frame(self.master)
+        library_frame.grid(row=4, column=0, columnspan=4, pady=10)
+        self.library_search = tk.StringVar()
+        self.library_search.trace_add("write", lambda *args: self.show_library())
+        tk.Entry(library_frame, textvariable=self.library_search).pack(fill="x", padx=20)
+        self.library_list = tk.Listbox(library_frame, width=80, height=8)
+        self.library_list.pack(padx=20)
+        self.library_list.bind("<Double-Button-1>", self.open_library_track)
 
-            separator = Separator('spleeter:2stems')
-            separator.separate_to_file(wav_path, output_directory)
-
-            self.vocals_path = os.path.join(output_directory, base_name, "vocals.wav")
-            self.accompaniment_path = os.path.join(output_directory, base_name, "accompaniment.wav")
-
-            if not os.path.exists(self.vocals_path) or not os.path.exists(self.accompaniment_path):
+    def slice_track(self):
+        # TensorFlow loads while the file dialog is open
+        self.job_queue.preload()
+        file_paths = filedialog.askopenfilenames(filetypes=[("MP3 files", "*.mp3")])
+        for file_path in file_paths:
+            self.job_queue.submit(file_path, model=MODELS[self.model_name.get()])
+
+    def update_job(self, job):
+        """Show a job's progress; called on the Tk main loop."""
+        index = self.job_queue.jobs.index(job)
+        if index < self.jobs_list.size():
+            self.jobs_list.delete(index)
+        self.jobs_list.insert(index, f"{job.name} - {job.stage}")
+
+        if job.stage == "failed":
+            messagebox.showerror("Error", f"Slicing {job.name} failed: {job.error}")
+        elif job.stage == "done":
+            stem_paths = find_stems(job.stems_directory)
+            if not stem_paths:
                 messagebox.showerror("Error", "Separation failed. Check files.")
                 return
 
-            self.play_button.config(state="normal")
+            self.library.index_directory(job.stems_directory)
+            self.show_library()
+
+            # Load the newest finished track unless something is already playing
+            if not self.is_playing:
+                self.set_stems(stem_paths)
+
+    def cancel_job(self):
+        for index in self.jobs_list.curselection():
+            self.job_queue.cancel(self.job_queue.jobs[index])
 
     def select_folder(self):
+        """Add a folder to the library, and open it if it holds stems itself."""
         folder_path = filedialog.askdirectory()
         if folder_path:
-            vocals_path = os.path.join(folder_path, "vocals.wav")
-            accompaniment_path = os.path.join(folder_path, "accompaniment.wav")
-
-            if not os.path.exists(vocals_path) or not os.path.exists(accompaniment_path):
-                messagebox.showerror("Error", "Folder does not contain required files.")
+            self.library.add_root(folder_path)
+            self.scan_library()
+            stem_paths = find_stems(folder_path)
+            if stem_model(stem_paths):
+                self.set_stems(stem_paths)
+
+    def show_library(self):
+        """List the indexed tracks matching the search box; only the index is queried."""
+        self.library_tracks = self.library.search(self.library_search.get())
+        self.library_list.delete(0, "end")
+        for track in self.library_tracks:
+            minutes, seconds = divmod(int(track["duration_s"] or 0), 60)
+            self.library_list.insert("end", f"{track['name']}  ({minutes}:{seconds:02d}, {track['model'] or 'unknown model'})")
+
+    def open_library_track(self, event=None):
+        for index in self.library_list.curselection():
+            stem_paths = self.library.stems(self.library_tracks[index]["directory"])
+            if not all(os.path.exists(path) for path in stem_paths.values()):
+                messagebox.showerror("Error", "The stems for this track have moved or been deleted.")
+                self.scan_library()
                 return
-
-            self.vocals_path = vocals_path
-            self.accompaniment_path = accompaniment_path
-            self.play_button.config(state="normal")
+            self.set_stems(stem_paths)
+
+    def scan_library(self):
+        """Rescan the library roots on a worker thread; poll_library_scan picks up the result."""
+        if self.library_rescan is not None:
+            self.master.after_cancel(self.library_rescan)
+            self.library_rescan = None
+        if self.library_scan is not None:
+            self.library_scan_again = True
+            return
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put(self.library.scan())
+            except Exception:
+                traceback.print_exc()
+                results.put(0)
+
+        self.library_scan = results
+        threading.Thread(target=work, daemon=True).start()
+        self.master.after(POLL_INTERVAL_MS, self.poll_library_scan)
+
+    def poll_library_scan(self):
+        try:
+            changed = self.library_scan.get_nowait()
+        except queue.Empty:
+            self.master.after(POLL_INTERVAL_MS, self.poll_library_scan)
+            return
+        self.library_scan = None
+        if changed:
+            self.show_library()
+        if self.library_scan_again:
+            self.library_scan_again = False
+            self.scan_library()
+        else:
+            self.library_rescan = self.master.after(LIBRARY_RESCAN_MS, self.scan_library)
+
+    def set_stems(self, stem_paths):
+        """Switch to a new set of stems and build one volume slider per stem."""
+        if self.is_playing:
+            self.stop_audio()
+        self.stem_paths = stem_paths
+        self.unload_segments()
+
+        for child in self.mixer_frame.winfo_children():
+            child.destroy()
+        self.stem_volumes = {}
+        for name in stem_paths:
+            self.stem_volumes[name] = tk.DoubleVar(value=1.0)
+            stem_frame = tk.Frame(self.mixer_frame)
+            stem_frame.pack(side="left", padx=20)
+            tk.Label(stem_frame, text=f"{name.capitalize()} Volume").pack()
+            ttk.Scale(stem_frame, from_=1.0, to=0.0, variable=self.stem_volumes[name], orient="vertical", command=self.update_volume).pack()
+
+        # Open the stems now so the waveform can be drawn before playback starts
+        try:
+            self.load_segments()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Unable to load stems: {e}")
+            return
+        self.play_button.config(state="normal")
+        self.export_button.config(state="normal")
 
     def load_segments(self):
-        """Load the full audio segments if not already loaded."""
-        if self.vocals_path and self.accompaniment_path and (self.vocals_segment is None or self.accompaniment_segment is None):
-            self.vocals_segment = AudioSegment.from_wav(self.vocals_path)
-            self.accompaniment_segment = AudioSegment.from_wav(self.accompaniment_path)
-            self.track_length = max(len(self.vocals_segment), len(self.accompaniment_segment)) / 1000.0
+        """Open the stems if not already loaded: WAVs are memory-mapped, compressed stems decoded ahead."""
+        if self.stem_paths and self.stem_samples is None:
+            load_start = time.perf_counter()
+            loaded = [open_stem(path) for path in self.stem_paths.values()]
+            self.sample_rate = loaded[0][1]
+            if any(rate != self.sample_rate or samples.shape[1] != loaded[0][0].shape[1] for samples, rate in loaded):
+                raise ValueError("Stems have different sample rates or channel counts.")
+
+            self.stem_samples = [samples for samples, _ in loaded]
+            self.track_length = max(len(samples) for samples in self.stem_samples) / self.sample_rate
             self.seek_slider.config(to=self.track_length)
-
-    def play_audio(self):
-        if not self.vocals_path or not self.accompaniment_path:
-            messagebox.showerror("Error", "No audio to play.")
+            self.engine.load(self.stem_samples, self.sample_rate)
+            logger.debug(f"Stems ready in {(time.perf_counter() - load_start) * 1000:.1f} ms")
+            self.track_frames = self.engine.length
+            self.view = (0, self.track_frames)
+            self.compute_peaks()
+
+    def unload_segments(self):
+        self.stem_samples = None
+        self.loop_points = [None, None]
+        self.stretch = (1.0, 0.0)
+        self.speed_percent.set(100)
+        self.semitones.set(0)
+        self.stretch_cache.cancel()
+        if self.stretch_poll is not None:
+            self.master.after_cancel(self.stretch_poll)
+            self.stretch_poll = None
+        self.peaks = None
+        self.view = (0, 0)
+        self.draw_waveform()
+
+    def compute_peaks(self):
+        """Load or build each stem's peak index on a worker thread; the result is picked up by poll_peaks."""
+        stems = self.stem_samples
+        paths = list(self.stem_paths.values())
+
+        def work():
+            try:
+                peaks = [PeakIndex.for_stem(path, samples) for path, samples in zip(paths, stems)]
+            except Exception:
+                traceback.print_exc()
+                peaks = []
+            self.peaks_results.put((stems, peaks))
+
+        threading.Thread(target=work, daemon=True).start()
+        if self.peaks_poll is None:
+            self.peaks_poll = self.master.after(POLL_INTERVAL_MS, self.poll_peaks)
+
+    def poll_peaks(self):
+        """Take finished peak indexes on the main thread, dropping any for stems since replaced."""
+        self.peaks_poll = None
+        while True:
+            try:
+                stems, peaks = self.peaks_results.get_nowait()
+            except queue.Empty:
+                break
+            if stems is self.stem_samples:
+                self.peaks = peaks
+                self.draw_waveform()
+        if self.peaks is None and self.stem_samples is not None:
+            self.peaks_poll = self.master.after(POLL_INTERVAL_MS, self.poll_peaks)
+
+    def draw_waveform(self):
+        """Redraw one lane per stem for the current view; each lane is a single min/max polygon."""
+        self.waveform.delete("wave")
+        if self.peaks:
+            width = max(self.waveform.winfo_width(), 1)
+            lane = max(self.waveform.winfo_height(), 1) / len(self.peaks)
+            start, end = self.view
+            x = np.arange(width)
+            for i, index in enumerate(self.peaks):
+                mins, maxs = index.columns(start, end, width)
+                middle = lane * (i + 0.5)
+                top = np.stack([x, middle - maxs * lane / 2], axis=1)
+                bottom = np.stack([x, middle - mins * lane / 2], axis=1)[::-1]
+                self.waveform.create_polygon(*np.concatenate([top, bottom]).ravel().tolist(),
+                                             fill="steelblue", outline="", tags="wave")
+        self.draw_loop()
+        self.waveform.tag_raise("playhead")
+        self.move_playhead()
+
+    def draw_loop(self):
+        """Shade the A/B loop region on the waveform, behind the stems."""
+        self.waveform.delete("loop")
+        start, end = self.view
+        if end <= start or None in self.loop_points:
             return
+        width = self.waveform.winfo_width()
+        loop_start, loop_end = (seconds * self.sample_rate for seconds in self.loop_points)
+        self.waveform.create_rectangle((loop_start - start) / (end - start) * width, 0,
+                                       (loop_end - start) / (end - start) * width, self.waveform.winfo_height(),
+                                       fill="lightyellow", outline="orange", tags="loop")
+        self.waveform.tag_lower("loop")
+
+    def set_loop_point(self, which):
+        """Mark the current position as the loop's start (0) or end (1); looping starts once both are set."""
+        if not self.engine.stems:
+            return
+        self.loop_points[which] = self.engine.position_seconds()
+        start, end = self.loop_points
+        if start is not None and end is not None:
+            try:
+                self.engine.set_loop(start, end)
+            except ValueError as e:
+                self.loop_points[which] = None
+                messagebox.showerror("Error", str(e))
+                return
+            if not start <= self.engine.position_seconds() < end:
+                self.engine.seek(start)
+                self.track_position.set(start)
+        self.draw_loop()
+        self.move_playhead()
+
+    def clear_loop(self):
+        self.loop_points = [None, None]
+        self.engine.clear_loop()
+        self.draw_loop()
+
+    def change_stretch(self, event=None):
+        """Play every stem at the chosen speed and pitch, from cached renders where possible."""
+        try:
+            setting = (self.speed_percent.get() / 100, float(self.semitones.get()))
+        except tk.TclError:
+            return
+        if self.stem_samples is None or setting == self.stretch:
+            return
+        self.stretch = setting
+        speed, semitones = setting
+        if setting == (1.0, 0.0):
+            stems = self.stem_samples
+        else:
+            stems = self.stretch_cache.get(list(zip(self.stem_paths.values(), self.stem_samples)), speed, semitones)
+        # Renders for settings the user has moved past would only slow down the one playback waits on
+        self.stretch_cache.cancel(keep=stems)
 
-        self.load_segments()
-
-        # Slice at current_offset
-        start_ms = int(self.current_offset * 1000)
-        vocals_slice = self.vocals_segment[start_ms:]
-        accompaniment_slice = self.accompaniment_segment[start_ms:]
-
-        # Export slices to temp WAV
-        vocals_slice.export("temp_vocals.wav", format="wav")
-        accompaniment_slice.export("temp_accompaniment.wav", format="wav")
+        if self.stretch_poll is None:
+            self.stretch_resume = self.is_playing and not self.is_paused
+        else:
+            self.master.after_cancel(self.stretch_poll)
+        self.engine.pause()
+        self.engine.set_stems(stems, speed)
+        self.wait_for_stretch()
+
+    def wait_for_stretch(self):
+        """Restore the loop and resume playback once the renders are ahead of the playhead."""
+        self.stretch_poll = None
+        needed = self.engine.position + int(STRETCH_LEAD_SECONDS * self.sample_rate)
+        if None not in self.loop_points:
+            needed = max(needed, int(self.loop_points[1] * self.sample_rate / self.engine.speed))
+        if not all(stem.ready(needed) for stem in self.engine.stems if isinstance(stem, StretchedStem)):
+            self.stretch_poll = self.master.after(POLL_INTERVAL_MS, self.wait_for_stretch)
+            return
+        if None not in self.loop_points:
+            self.engine.set_loop(*self.loop_points)
+        # Pause or Stop while the render was catching up wins over resuming
+        if self.stretch_resume and self.is_playing and not self.is_paused:
+            self.engine.play()
+        self.stretch_resume = False
+
+    def move_playhead(self):
+        start, end = self.view
+        if end <= start:
+            self.waveform.coords("playhead", 0, 0, 0, 0)
+            return
+        x = (self.engine.position_seconds() * self.sample_rate - start) / (end - start) * self.waveform.winfo_width()
+        self.waveform.coords("playhead", x, 0, x, self.waveform.winfo_height())
 
-        pygame.mixer.quit()
-        pygame.mixer.init()
+    def zoom_waveform(self, event):
+        """Zoom the waveform in or out around the mouse pointer."""
+        start, end = self.view
+        if not self.peaks or end <= start:
+            return
+        width = max(self.waveform.winfo_width(), 1)
+        zoom_in = event.num == 4 or (event.num != 5 and event.delta > 0)
+        span = end - start
+        # Stop zooming in at one frame per column and out at the whole track
+        new_span = min(max(span / ZOOM_STEP if zoom_in else span * ZOOM_STEP, width), self.track_frames)
+        anchor = start + span * event.x / width
+        new_start = min(max(anchor - (anchor - start) * new_span / span, 0), self.track_frames - new_span)
+        self.view = (int(new_start), int(new_start + new_span))
+        self.draw_waveform()
+
+    def waveform_click(self, event):
+        """Seek to the clicked point of the waveform."""
+        start, end = self.view
+        if not self.peaks or end <= start:
+            return
+        frame = start + (end - start) * event.x / max(self.waveform.winfo_width(), 1)
+        self.track_position.set(frame / self.sample_rate)
+        if self.is_playing:
+            self.seek_audio()
+        else:
+            self.engine.seek(frame / self.sample_rate)
+            self.move_playhead()
 
-        self.vocals_sound = pygame.mixer.Sound("temp_vocals.wav")
-        self.accompaniment_sound = pygame.mixer.Sound("temp_accompaniment.wav")
+    def play_audio(self):
+        if not self.stem_paths:
+            messagebox.showerror("Error", "No audio to play.")
+            return
 
-        self.vocals_channel = pygame.mixer.Channel(0)
-        self.accompaniment_channel = pygame.mixer.Channel(1)
+        try:
+            self.load_segments()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Unable to load stems: {e}")
+            return
 
-        self.vocals_channel.play(self.vocals_sound, loops=-1)
-        self.accompaniment_channel.play(self.accompaniment_sound, loops=-1)
+        if self.engine.finished:
+            self.engine.seek(0.0)
+        self.engine.play()
 
         self.is_playing = True
+        self.is_paused = False
+        self.start_position_clock()
         self.pause_button.config(state="normal")
         self.stop_button.config(state="normal")
 
-        # Reset timing if starting fresh
-        if self.current_offset == 0.0:
-            self.play_start_time = time.time()
-
         self.update_volume()
 
     def pause_audio(self):
         if not self.is_playing:
             return
         if self.is_paused:
-            # Unpausing
-            self.vocals_channel.unpause()
-            self.accompaniment_channel.unpause()
-            self.play_start_time = time.time()
+            self.engine.play()
             self.is_paused = False
+            self.start_position_clock()
         else:
-            # Pausing
-            self.current_offset += time.time() - self.play_start_time
-            self.vocals_channel.pause()
-            self.accompaniment_channel.pause()
+            self.engine.pause()
             self.is_paused = True
+            self.stretch_resume = False
+            self.stop_position_clock()
+            self.track_position.set(self.engine.position_seconds())
 
     def stop_audio(self):
-        pygame.mixer.stop()
+        self.engine.stop()
+        self.stop_position_clock()
         self.is_playing = False
+        self.stretch_resume = False
         self.pause_button.config(state="disabled")
         self.stop_button.config(state="disabled")
-        self.current_offset = 0.0
         self.is_paused = False
+        self.move_playhead()
 
     def update_volume(self, event=None):
-        if hasattr(self, 'vocals_channel') and hasattr(self, 'accompaniment_channel'):
-            self.vocals_channel.set_volume(self.vocals_volume.get())
-            self.accompaniment_channel.set_volume(self.accompaniment_volume.get())
+        """Send the sliders' gains to the engine, which ramps to them inside the audio callback."""
+        if self.engine.stems:
+            law = VOLUME_LAWS[self.volume_law.get()]
+            for index, volume in enumerate(self.stem_volumes.values()):
+                self.engine.set_gain(index, fader_gain(volume.get(), law))
+
+    def export_mix(self):
+        """Render the stems with the current slider gains to a file, in the background."""
+        output_path = filedialog.asksaveasfilename(defaultextension=".wav", filetypes=[(codec.upper(), f"*.{codec}") for codec in CODECS])
+        if not output_path:
+            return
+        codec = os.path.splitext(output_path)[1].lstrip(".").lower()
+        if codec not in CODECS:
+            messagebox.showerror("Error", f"Unsupported format: {codec or 'none'}")
+            return
+
+        law = VOLUME_LAWS[self.volume_law.get()]
+        gains = [fader_gain(volume.get(), law) for volume in self.stem_volumes.values()]
+        stem_paths = dict(self.stem_paths)
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put(render_mix(stem_paths, gains, output_path, codec=codec))
+            except Exception as e:
+                traceback.print_exc()
+                results.put(e)
+
+        self.export_button.config(state="disabled")
+        threading.Thread(target=work, daemon=True).start()
+        self.master.after(POLL_INTERVAL_MS, self.poll_export, results)
+
+    def poll_export(self, results):
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            self.master.after(POLL_INTERVAL_MS, self.poll_export, results)
+            return
+        self.export_button.config(state="normal")
+        if isinstance(result, Exception):
+            messagebox.showerror("Error", f"Export failed: {result}")
+        else:
+            messagebox.showinfo("Export Mix", f"Saved {os.path.basename(result['output'])} "
+                                              f"({result['realtime_factor']:.0f}x real time)")
 
     def seek_audio(self, event=None):
         if not self.is_playing:
             return
 
-        # Get desired position
-        new_position = self.track_position.get()
-
-        # Stop current playback
-        self.vocals_channel.stop()
-        self.accompaniment_channel.stop()
-
-        # Update offset and time
-        self.current_offset = new_position
-        self.play_start_time = time.time()
-
-        # Replay from new offset using the slicing method
-        self.play_audio()
+        seek_start = time.perf_counter()
+        self.engine.seek(self.track_position.get())
+
+        # Worst case the new position is audible once the block already queued has played
+        latency_ms = (time.perf_counter() - seek_start + MIXER_BUFFER / self.sample_rate) * 1000
+        if latency_ms > SEEK_BUDGET_MS:
+            logger.warning(f"Seek took {latency_ms:.1f} ms (budget {SEEK_BUDGET_MS} ms)")
+        self.move_playhead()
+
+    def start_position_clock(self):
+        if self.position_clock is None:
+            self.position_clock = self.master.after(int(1000 / self.position_fps), self.publish_position)
+
+    def stop_position_clock(self):
+        if self.position_clock is not None:
+            self.master.after_cancel(self.position_clock)
+            self.position_clock = None
+
+    def publish_position(self):
+        """Push the engine's sample position to the seek slider; only scheduled while playing."""
+        self.position_clock = None
+        if self.engine.finished:
+            self.stop_audio()
+            self.track_position.set(self.track_length)
+            return
+        self.track_position.set(self.engine.position_seconds())
+        self.move_playhead()
+        if self.is_playing and not self.is_paused:
+            self.start_position_clock()
 
-    def update_seek_slider(self):
-        while True:
-            if self.is_playing:
-                if self.is_paused:
-                    current_position = self.current_offset
-                else:
-                    current_position = self.current_offset + (time.time() - self.play_start_time)
+def report_startup(root, start=STARTUP_START):
+    """Print the time from importing the app to its window first being mapped."""
+    def on_map(event):
+        if event.widget is root:
+            root.unbind("<Map>")
+            print(f"Window visible {(time.perf_counter() - start) * 1000:.0f} ms after import")
 
-                # Clamp to track length
-                if current_position > self.track_length:
-                    current_position = self.track_length
-                    # Optionally stop if the track ends
-                    self.stop_audio()
+    root.bind("<Map>", on_map)
 
-                self.track_position.set(current_position)
-            time.sleep(0.1)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     root = tk.Tk()
+    report_startup(root)
     app = AudioMixerApp(root)
     root.mainloop()
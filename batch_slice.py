@@ -0,0 +1,234 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from separator_pool import cpu_thread_defaults, THREADS_PER_MODEL
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+
+# Set in each worker process by init_worker
+_worker_pool = None
+_worker_model = None
+
+
+def collect_inputs(patterns):
+    """Expand directories and glob patterns into {audio file: output name}, sorted by file.
+
+    Files found under a directory are named by their path relative to it, so tracks with
+    the same file name in different folders get separate stem folders. Names that still
+    collide get a short hash of the file's path.
+    """
+    names = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        path = os.path.abspath(os.path.join(root, name))
+                        names.setdefault(path, os.path.splitext(os.path.relpath(path, os.path.abspath(pattern)))[0])
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path):
+                    path = os.path.abspath(path)
+                    names.setdefault(path, os.path.splitext(os.path.basename(path))[0])
+    counts = Counter(os.path.normcase(name) for name in names.values())
+    for path, name in names.items():
+        if counts[os.path.normcase(name)] > 1:
+            names[path] = f"{name}-{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+    return dict(sorted(names.items()))
+
+
+def load_manifest(manifest_path):
+    """Return the last recorded result for each input in the manifest."""
+    results = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Partially written line from an interrupted run
+                    continue
+                results[entry["input"]] = entry
+    return results
+
+
+def init_worker(model, intra_op_threads=None, inter_op_threads=None):
+    """Load one warm separator per worker process, with its TensorFlow thread pools sized first."""
+    global _worker_pool, _worker_model
+    from separator_pool import SeparatorPool, configure_cpu_threads
+    if intra_op_threads:
+        configure_cpu_threads(intra_op_threads, inter_op_threads or 1)
+    # Workers already run in parallel, so Spleeter must not spawn its own processes
+    _worker_pool = SeparatorPool(multiprocess=False)
+    _worker_pool.get(model)
+    _worker_model = model
+
+
+def slice_one(input_path, output_root, window=None, codec='wav', bitrate='192k', skip_silence=True, name=None):
+    from slicer import slice_file
+    start = time.perf_counter()
+    try:
+        stems_directory = slice_file(input_path, output_root, model=_worker_model, pool=_worker_pool, window=window,
+                                     codec=codec, bitrate=bitrate, skip_silence=skip_silence, name=name)
+    except Exception as e:
+        return {"input": input_path, "status": "failed", "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(), "seconds": time.perf_counter() - start}
+    return {"input": input_path, "status": "ok", "stems": stems_directory,
+            "seconds": time.perf_counter() - start}
+
+
+def slice_group(input_paths, output_root, window=None, codec='wav', bitrate='192k', skip_silence=True, names=None):
+    """Slice a group of tracks, returning their results and the separation latencies they took."""
+    seen = len(_worker_pool.latencies.get(_worker_model, []))
+    results = separate_group(input_paths, output_root, window, codec, bitrate, skip_silence, names)
+    return results, _worker_pool.latencies.get(_worker_model, [])[seen:]
+
+
+def separate_group(input_paths, output_root, window=None, codec='wav', bitrate='192k', skip_silence=True, names=None):
+    """Slice a group of tracks in one model invocation, falling back to one at a time if that fails."""
+    names = names or [None] * len(input_paths)
+    if len(input_paths) == 1 or window:
+        return [slice_one(path, output_root, window, codec, bitrate, skip_silence, name)
+                for path, name in zip(input_paths, names)]
+    from slicer import slice_batch
+    start = time.perf_counter()
+    try:
+        directories = slice_batch(input_paths, output_root, model=_worker_model, pool=_worker_pool, codec=codec,
+                                  bitrate=bitrate, names=names)
+    except Exception:
+        # One bad track shouldn't fail the others in its group
+        traceback.print_exc()
+        return [slice_one(path, output_root, window, codec, bitrate, skip_silence, name)
+                for path, name in zip(input_paths, names)]
+    seconds = (time.perf_counter() - start) / len(input_paths)
+    return [{"input": path, "status": "ok", "stems": directory, "seconds": seconds, "batch": len(input_paths)}
+            for path, directory in zip(input_paths, directories)]
+
+
+def run_batch(inputs, output_root, model='spleeter:2stems', jobs=1, resume=True, manifest_path=None, window=None,
+              codec='wav', bitrate='192k', batch_size=1, intra_op_threads=None, inter_op_threads=None, skip_silence=True,
+              names=None):
+    """Slice every input across a pool of worker processes, appending results to the manifest.
+
+    names maps an input to its output name (see collect_inputs); by default it's the file name.
+    Each worker separates batch_size tracks per model invocation, with its TensorFlow thread
+    pools fixed at intra_op_threads and inter_op_threads if given.
+    """
+    from separator_pool import latency_report
+    from slicer import stems_directory_for
+    names = names or {}
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_root, "batch_manifest.jsonl")
+
+    pending = inputs
+    if resume:
+        previous = load_manifest(manifest_path)
+        # A track only counts as done if it went where it would go now, not into a folder it shared with another
+        pending = [path for path in inputs
+                   if not (previous.get(path, {}).get("status") == "ok" and os.path.isdir(previous[path]["stems"])
+                           and previous[path]["stems"] == stems_directory_for(path, output_root, names.get(path)))]
+        skipped = len(inputs) - len(pending)
+        if skipped:
+            print(f"Resuming: skipping {skipped} already sliced track(s)")
+    if not pending:
+        return []
+
+    failures = []
+    latencies = []
+    done = 0
+    start = time.perf_counter()
+    print(f"{jobs} worker(s), {intra_op_threads or 'default'} intra-op / {inter_op_threads or 'default'} inter-op "
+          f"thread(s) each, {batch_size} track(s) per invocation")
+    groups = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                initargs=(model, intra_op_threads, inter_op_threads)) as executor:
+        futures = {executor.submit(slice_group, group, output_root, window, codec, bitrate, skip_silence,
+                                   [names.get(path) for path in group]): group
+                   for group in groups}
+        for future in as_completed(futures):
+            try:
+                results, group_latencies = future.result()
+                latencies.extend(group_latencies)
+            except BrokenProcessPool as e:
+                results = [{"input": path, "status": "failed", "error": f"worker crashed: {e}"}
+                           for path in futures[future]]
+            for result in results:
+                manifest.write(json.dumps(result) + "\n")
+                manifest.flush()
+                done += 1
+                if result["status"] == "ok":
+                    print(f"[{done}/{len(pending)}] ok {result['input']} ({result['seconds']:.1f}s)")
+                else:
+                    failures.append(result)
+                    print(f"[{done}/{len(pending)}] FAILED {result['input']}: {result['error']}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"Sliced {done - len(failures)} of {len(pending)} track(s) in {elapsed:.1f}s, {len(failures)} failed")
+    if elapsed > 0:
+        print(f"Throughput: {(done - len(failures)) * 3600 / elapsed:.0f} tracks/hour")
+    if latencies:
+        print(f"Separation latency:\n{latency_report({model: latencies})}")
+    for failure in failures:
+        print(f"  {failure['input']}: {failure['error']}", file=sys.stderr)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Separate a batch of tracks into stems without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="directories or glob patterns of tracks to slice")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="root directory for the separated stems")
+    default_jobs, _, default_inter_op = cpu_thread_defaults()
+    parser.add_argument("-j", "--jobs", type=int, default=default_jobs,
+                        help="number of worker processes, each holding one warm model (default: cores / %d)"
+                             % THREADS_PER_MODEL)
+    parser.add_argument("--threads", type=int,
+                        help="TensorFlow intra-op threads per worker (default: cores / jobs)")
+    parser.add_argument("--inter-op-threads", type=int, default=default_inter_op,
+                        help="TensorFlow inter-op threads per worker")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="tracks separated together in one model invocation by each worker")
+    parser.add_argument("-m", "--model", default="spleeter:2stems", help="Spleeter model configuration")
+    parser.add_argument("--manifest", help="results file used for resume (default: <output>/batch_manifest.jsonl)")
+    parser.add_argument("--window", type=float,
+                        help="stream long tracks through the model in windows of this many seconds")
+    parser.add_argument("--codec", default="wav", choices=("wav", "flac", "ogg", "mp3", "m4a"),
+                        help="stem output format")
+    parser.add_argument("--bitrate", default="192k", help="bitrate for lossy stem formats")
+    parser.add_argument("--keep-silence", action="store_true",
+                        help="run the model over long silences too (batched tracks always are)")
+    parser.add_argument("--no-resume", action="store_true", help="re-slice tracks that already succeeded")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+    if args.batch > 1 and args.window:
+        parser.error("--batch can't be combined with --window")
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.jobs)
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        parser.error("no audio files matched")
+
+    failures = run_batch(list(inputs), os.path.abspath(args.output), model=args.model, jobs=args.jobs,
+                         resume=not args.no_resume, manifest_path=args.manifest, window=args.window,
+                         codec=args.codec, bitrate=args.bitrate, batch_size=args.batch,
+                         intra_op_threads=threads, inter_op_threads=args.inter_op_threads,
+                         skip_silence=not args.keep_silence, names=inputs)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import perf
+
+MODEL = 'spleeter:2stems'
+
+
+def synthetic_audio(duration, channels=2, sample_rate=44100, seed=0):
+    """A reproducible int16 (frames, channels) test signal: a chord, a vibrato 'voice' and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    chord = sum(np.sin(2 * np.pi * f * t) for f in (110.0, 138.6, 164.8)) / 3
+    voice = np.sin(2 * np.pi * 440.0 * t + 3 * np.sin(2 * np.pi * 5 * t)) * (np.sin(2 * np.pi * 0.25 * t) > 0)
+    mono = 0.4 * chord + 0.3 * voice
+    signal = np.stack([mono + 0.02 * rng.standard_normal(len(t)) for _ in range(channels)], axis=1)
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def write_mp3(samples, path, sample_rate=44100):
+    from pydub import AudioSegment
+    segment = AudioSegment(samples.tobytes(), frame_rate=sample_rate, sample_width=2, channels=samples.shape[1])
+    segment.export(path, format="mp3", bitrate="192k")
+
+
+def measure(name, action, results, repeat=1, trace_allocations=True):
+    """Run action repeat times, recording wall time, Python/NumPy allocation peak and RSS.
+
+    Tracing allocations slows Python down, so the timed runs go untraced and the peak
+    comes from one more run under tracemalloc. Actions that only do real work the first
+    time (like loading a model) pass trace_allocations=False and record no peak.
+    """
+    times = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = action()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if trace_allocations:
+        tracemalloc.start()
+        action()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results.append({
+        "stage": name,
+        "repeat": repeat,
+        "mean_s": statistics.mean(times),
+        "min_s": min(times),
+        "max_s": max(times),
+        "alloc_peak_mb": None if peak is None else peak / perf.MB,
+        "rss_mb": perf.rss_mb(),
+    })
+    print(f"{name}: {statistics.mean(times) * 1000:.1f} ms", file=sys.stderr)
+    return value
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def import_app():
+    """Import the GUI module in a fresh interpreter, as happens before its window can appear."""
+    subprocess.run([sys.executable, "-c", "import audioslice_v3"], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(duration=60.0, channels=2, sample_rate=44100, repeat=3, seeks=50, with_model=True):
+    from mix_engine import MixEngine
+    from slicer import convert_mp3_to_wav, write_stems
+    from stem_io import open_wav, decode_wav
+
+    results = []
+    measure("import_app", import_app, results, repeat)
+    with tempfile.TemporaryDirectory() as work:
+        mp3_path = os.path.join(work, "synthetic.mp3")
+        wav_path = os.path.join(work, "synthetic.wav")
+        samples = synthetic_audio(duration, channels, sample_rate)
+        write_mp3(samples, mp3_path, sample_rate)
+
+        measure("convert_mp3_to_wav", lambda: convert_mp3_to_wav(mp3_path, wav_path), results, repeat)
+
+        if with_model:
+            from separator_pool import SeparatorPool
+            pool = SeparatorPool(multiprocess=False)
+            measure("model_load", lambda: pool.get(MODEL), results, trace_allocations=False)
+            measure("separate_to_file", lambda: pool.separate_to_file(wav_path, os.path.join(work, "separated"), model=MODEL),
+                    results, repeat)
+            stems = pool.separate(samples.astype(np.float32) / 32768, model=MODEL)
+        else:
+            # Without a model, write the mix as every stem so the later stages still have input
+            mix = samples.astype(np.float32) / 32768
+            stems = {"vocals": mix, "accompaniment": mix}
+
+        stems_directory = os.path.join(work, "stems")
+        paths = measure("stem_write", lambda: write_stems(stems, stems_directory, sample_rate), results, repeat)
+        stem_paths = list(paths.values())
+
+        measure("load_segments_decode", lambda: [decode_wav(path) for path in stem_paths], results, repeat)
+        loaded = measure("load_segments", lambda: [open_wav(path) for path in stem_paths], results, repeat)
+
+        engine = MixEngine()
+        engine.load([stem for stem, _ in loaded], loaded[0][1])
+        offsets = np.random.default_rng(1).uniform(0, duration, seeks)
+
+        def play_from_offset():
+            engine.seek(offsets[0])
+            engine.render(engine.block_size)
+
+        def seek_sweep():
+            for offset in offsets:
+                engine.seek(offset)
+                engine.render(engine.block_size)
+
+        measure("play_from_offset", play_from_offset, results, repeat)
+        measure(f"seek_x{seeks}", seek_sweep, results, repeat)
+
+        from stretch import stretch_blocks
+        measure("time_stretch_x0.75", lambda: sum(len(block) for block in stretch_blocks(loaded[0][0], 0.75)),
+                results, repeat)
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"duration_s": duration, "channels": channels, "sample_rate": sample_rate,
+                   "repeat": repeat, "seeks": seeks, "model": MODEL if with_model else None},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the separation and playback pipeline on synthetic audio.")
+    parser.add_argument("--duration", type=float, default=60.0, help="length of the synthetic track in seconds")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage")
+    parser.add_argument("--seeks", type=int, default=50, help="random seeks in the seek stage")
+    parser.add_argument("--no-model", action="store_true", help="skip the Spleeter stages")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.duration, args.channels, args.sample_rate, args.repeat, args.seeks, not args.no_model)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,138 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import perf
+
+logger = logging.getLogger("audioslicer.slice")
+
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+def add_hook(hook):
+    """Register hook(record) to receive every stage and job record, e.g. to feed a metrics collector.
+
+    Stage records have "type": "stage"; the summary emitted when a job finishes has "type": "job".
+    Hooks run on the slicing thread, so they should hand work off rather than block.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    with _hooks_lock:
+        _hooks.remove(hook)
+
+
+def emit(record):
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(record)
+        except Exception:
+            logger.exception("Instrumentation hook failed")
+
+
+class Cancelled(Exception):
+    """Raised from a progress callback to abandon a job; the job is logged as cancelled."""
+
+
+class RssSampler:
+    """Samples resident memory on a background thread to find a stage's peak."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = perf.rss_mb()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss = perf.rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak or 0.0, rss)
+
+    def __enter__(self):
+        if self.peak is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        rss = perf.rss_mb()
+        if rss is not None:
+            self.peak = max(self.peak or 0.0, rss)
+
+
+class SliceTrace:
+    """Per-stage measurements for one slicing job.
+
+    Each stage records wall and CPU time, bytes read and written and peak resident memory.
+    CPU time and I/O are process-wide counters, which include the model's own worker threads
+    but also anything else the process does concurrently.
+    """
+
+    def __init__(self, progress=None, **fields):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.progress = progress
+        self.stages = []
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.progress is not None:
+            # Raising here (e.g. to cancel) aborts the job before the stage starts
+            self.progress(name)
+        read_before, written_before = perf.io_bytes()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        sampler = RssSampler()
+        try:
+            with sampler:
+                yield
+        finally:
+            read_after, written_after = perf.io_bytes()
+            record = {
+                "type": "stage",
+                "job": self.job_id,
+                "stage": name,
+                "wall_s": time.perf_counter() - wall_start,
+                "cpu_s": time.process_time() - cpu_start,
+                "read_bytes": None if read_before is None else read_after - read_before,
+                "written_bytes": None if written_before is None else written_after - written_before,
+                "peak_rss_mb": sampler.peak,
+            }
+            self.stages.append(record)
+            emit(record)
+
+    def summary(self):
+        """Stage records merged by name, so windowed slices report one total per stage."""
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                        "read_bytes": 0, "written_bytes": 0, "peak_rss_mb": 0.0})
+            total["count"] += 1
+            for key in ("wall_s", "cpu_s", "read_bytes", "written_bytes"):
+                if record[key] is not None and total[key] is not None:
+                    total[key] += record[key]
+                else:
+                    total[key] = None
+            if record["peak_rss_mb"] is not None:
+                total["peak_rss_mb"] = max(total["peak_rss_mb"], record["peak_rss_mb"])
+        return totals
+
+    def finish(self, status="ok", error=None):
+        """Emit the job summary and write it as one structured log line."""
+        record = dict(self.fields, type="job", job=self.job_id, status=status, error=error,
+                      pid=os.getpid(), wall_s=time.perf_counter() - self.start, stages=self.summary())
+        emit(record)
+        logger.info(json.dumps(record))
+        return record
@@ -0,0 +1,117 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import traceback
+from instrument import Cancelled
+
+logger = logging.getLogger("audioslicer.jobs")
+
+POLL_INTERVAL_MS = 100
+
+
+class SliceJob:
+    def __init__(self, job_id, input_path, model):
+        self.id = job_id
+        self.input_path = input_path
+        self.model = model
+        self.name = os.path.basename(input_path)
+        self.stage = "queued"
+        self.stems_directory = None
+        self.error = None
+        self.cancel_requested = threading.Event()
+
+    @property
+    def active(self):
+        return self.stage not in ("done", "failed", "cancelled")
+
+
+class SliceJobQueue:
+    """Runs slicing jobs on worker threads and reports their progress on the Tk main loop.
+
+    Workers never touch Tk: they post (job, stage) events to a queue which is drained by
+    an after() callback, so on_update always runs on the main thread. The callback is only
+    scheduled while jobs are outstanding.
+
+    With a client the separation runs in the separation service, falling back to slicing
+    in-process if the service can't be reached.
+    """
+
+    def __init__(self, master, on_update, workers=1, client=None):
+        self.master = master
+        self.on_update = on_update
+        self.client = client
+        self.pending = queue.Queue()
+        self.events = queue.Queue()
+        self.jobs = []
+        self.ids = itertools.count(1)
+        self.poll_id = None
+        for _ in range(workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, input_path, model='spleeter:2stems'):
+        job = SliceJob(next(self.ids), input_path, model)
+        self.jobs.append(job)
+        self.pending.put(job)
+        self.on_update(job)
+        self.schedule_poll()
+        return job
+
+    def preload(self):
+        """Import the slicer, and with it TensorFlow, in the background so the first slice starts sooner."""
+        if self.client is not None:
+            return
+        threading.Thread(target=lambda: __import__("slicer"), daemon=True).start()
+
+    def cancel(self, job):
+        """Cancel a queued job, or a running one at its next stage boundary."""
+        job.cancel_requested.set()
+
+    def work(self):
+        while True:
+            job = self.pending.get()
+
+            def progress(stage, job=job):
+                if job.cancel_requested.is_set():
+                    raise Cancelled()
+                self.events.put((job, stage))
+
+            if job.cancel_requested.is_set():
+                self.events.put((job, "cancelled"))
+                continue
+            try:
+                job.stems_directory = self.slice(job, progress)
+                self.events.put((job, "done"))
+            except Cancelled:
+                self.events.put((job, "cancelled"))
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+                self.events.put((job, "failed"))
+
+    def slice(self, job, progress):
+        if self.client is not None:
+            progress("service")
+            try:
+                return self.client.separate(job.input_path, model=job.model)
+            except OSError as e:
+                logger.warning(f"Separation service unavailable ({e}), slicing {job.name} locally")
+        from slicer import slice_cached
+        return slice_cached(job.input_path, model=job.model, progress=progress)
+
+    def schedule_poll(self):
+        if self.poll_id is None:
+            self.poll_id = self.master.after(POLL_INTERVAL_MS, self.poll)
+
+    def poll(self):
+        self.poll_id = None
+        while True:
+            try:
+                job, stage = self.events.get_nowait()
+            except queue.Empty:
+                break
+            job.stage = stage
+            self.on_update(job)
+        if any(job.active for job in self.jobs):
+            self.schedule_poll()
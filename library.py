@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from stem_cache import CACHE_DIR, META_FILE
+from stem_io import STEM_EXTENSIONS, find_stems, stem_info, stem_model
+
+logger = logging.getLogger("audioslicer.library")
+
+LIBRARY_PATH = os.path.join(os.path.expanduser("~"), ".audioslicer", "library.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY, scanned REAL);
+CREATE TABLE IF NOT EXISTS tracks (
+    directory TEXT PRIMARY KEY, root TEXT, name TEXT, model TEXT, source TEXT,
+    sample_rate INTEGER, channels INTEGER, duration_s REAL, indexed REAL
+);
+CREATE INDEX IF NOT EXISTS tracks_name ON tracks (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS stems (
+    directory TEXT, name TEXT, position INTEGER, path TEXT, size INTEGER, mtime REAL,
+    PRIMARY KEY (directory, name)
+);
+"""
+
+
+class StemLibrary:
+    """An SQLite index of every stem folder under a set of root directories.
+
+    scan() walks the roots and only re-reads folders whose stem files are new or have a
+    different size or mtime, so rescanning a large library is cheap and listing or
+    searching it never touches the filesystem. It is safe to scan on one thread while
+    another searches.
+    """
+
+    def __init__(self, path=LIBRARY_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def add_root(self, path):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO roots (path) VALUES (?)", (os.path.abspath(path),))
+
+    def remove_root(self, path):
+        path = os.path.abspath(path)
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM roots WHERE path = ?", (path,))
+            self.connection.execute("DELETE FROM stems WHERE directory IN (SELECT directory FROM tracks WHERE root = ?)",
+                                    (path,))
+            self.connection.execute("DELETE FROM tracks WHERE root = ?", (path,))
+
+    def roots(self):
+        with self.lock:
+            return [row["path"] for row in self.connection.execute("SELECT path FROM roots ORDER BY path")]
+
+    def scan(self, roots=None):
+        """Bring the index up to date with the roots; returns the number of tracks added, changed or removed."""
+        changed = 0
+        for root in roots or self.roots():
+            seen = set()
+            for directory, subdirectories, files in os.walk(root):
+                # Skip hidden folders, including the stem cache's scratch directories
+                subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+                if not any(os.path.splitext(name)[1].lower() in STEM_EXTENSIONS for name in files):
+                    continue
+                seen.add(directory)
+                try:
+                    changed += self.index_directory(directory, root)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping {directory}: {e}")
+            with self.lock, self.connection:
+                known = [row["directory"] for row in
+                         self.connection.execute("SELECT directory FROM tracks WHERE root = ?", (root,))]
+                for directory in known:
+                    if directory not in seen:
+                        self.delete(directory)
+                        changed += 1
+                self.connection.execute("UPDATE roots SET scanned = ? WHERE path = ?", (time.time(), root))
+        return changed
+
+    def index_directory(self, directory, root=None):
+        """Index one stem folder unless its stems are unchanged; returns 1 if it was (re)indexed."""
+        directory = os.path.abspath(directory)
+        if root is None:
+            root = next((path for path in self.roots() if directory.startswith(path + os.sep)), None)
+        stems = find_stems(directory)
+        meta = {}
+        try:
+            with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        # Only a model's full set of stems, or a cache entry, is a track; not a folder of songs
+        if not meta and stem_model(stems) is None:
+            stems = {}
+        current = {}
+        for name, path in stems.items():
+            stat = os.stat(path)
+            current[name] = (path, stat.st_size, stat.st_mtime)
+        with self.lock:
+            known = {row["name"]: (row["path"], row["size"], row["mtime"]) for row in
+                     self.connection.execute("SELECT name, path, size, mtime FROM stems WHERE directory = ?",
+                                             (directory,))}
+        if known == current:
+            return 0
+        if not stems:
+            with self.lock, self.connection:
+                self.delete(directory)
+            return 1
+
+        infos = [stem_info(path) for path in stems.values()]
+        model = meta.get("model") or stem_model(stems)
+        source = meta.get("source")
+        name = os.path.splitext(os.path.basename(source))[0] if source else os.path.basename(directory)
+
+        with self.lock, self.connection:
+            self.delete(directory)
+            self.connection.execute(
+                "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (directory, root, name, model, source, infos[0][0], infos[0][1], max(info[2] for info in infos),
+                 time.time()))
+            self.connection.executemany(
+                "INSERT INTO stems VALUES (?, ?, ?, ?, ?, ?)",
+                [(directory, stem, position) + current[stem] for position, stem in enumerate(stems)])
+        return 1
+
+    def delete(self, directory):
+        # Callers hold the lock and a transaction
+        self.connection.execute("DELETE FROM stems WHERE directory = ?", (directory,))
+        self.connection.execute("DELETE FROM tracks WHERE directory = ?", (directory,))
+
+    def search(self, text="", limit=500):
+        """Tracks whose name, model or source contains text, by name."""
+        # Typed % and _ are literal characters, not wildcards
+        escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(
+                "SELECT * FROM tracks WHERE name LIKE ? ESCAPE '\\' OR model LIKE ? ESCAPE '\\' "
+                "OR source LIKE ? ESCAPE '\\' ORDER BY name COLLATE NOCASE LIMIT ?", (pattern, pattern, pattern, limit))]
+
+    def stems(self, directory):
+        """Map stem name to path for an indexed track, in display order."""
+        with self.lock:
+            return {row["name"]: row["path"] for row in self.connection.execute(
+                "SELECT name, path FROM stems WHERE directory = ? ORDER BY position", (directory,))}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library():
+    """Return the process-wide library, which always watches the stem cache."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = StemLibrary()
+            _library.add_root(CACHE_DIR)
+        return _library
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the index of sliced tracks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="watch directories of stems and index them")
+    add.add_argument("directories", nargs="+")
+    commands.add_parser("scan", help="re-index new and changed stems under every watched directory")
+    search = commands.add_parser("search", help="list tracks matching some text")
+    search.add_argument("text", nargs="?", default="")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    library = get_library()
+    if args.command == "add":
+        for directory in args.directories:
+            library.add_root(directory)
+        print(f"Indexed {library.scan([os.path.abspath(d) for d in args.directories])} track(s)")
+    elif args.command == "scan":
+        start = time.perf_counter()
+        changed = library.scan()
+        print(f"{changed} track(s) changed in {time.perf_counter() - start:.2f}s")
+    else:
+        for track in library.search(args.text):
+            print(f"{track['name']}\t{track['model'] or '?'}\t{track['duration_s']:.1f}s\t{track['directory']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import threading
+import numpy as np
+
+# A full-scale gain change is spread over this long, short enough to feel immediate
+RAMP_SECONDS = 0.01
+# Range of a dB-law fader: the bottom of the slider is silence, the step above it this far down
+FADER_DB_RANGE = 60.0
+
+
+def db_to_linear(db):
+    return 10 ** (db / 20)
+
+
+def fader_gain(position, law="linear"):
+    """Map a 0..1 slider position to a gain, either directly or on a dB taper."""
+    if law == "db":
+        return 0.0 if position <= 0 else float(db_to_linear((position - 1) * FADER_DB_RANGE))
+    return position
+
+
+class MixEngine:
+    """Mixes any number of stems into a single output stream from the audio device callback.
+
+    Each callback sums the next block of every stem with its gain in one vectorized pass,
+    and the sample counter it advances is the authoritative playback position. Gain changes
+    only set a target; the callback slews towards it sample by sample so they never click.
+    An A/B loop plays from a copy of the loop region held in memory, wrapping at the exact
+    sample, so looping never waits on the disk.
+
+    Stems may be time-stretched renders playing at speed; positions and loop points in
+    seconds are always in the original track's time.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2, block_size=512, ramp_seconds=RAMP_SECONDS):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.ramp_seconds = ramp_seconds
+        self.stems = []
+        self.gains = np.ones(0, dtype=np.float32)
+        self.targets = np.ones(0, dtype=np.float32)
+        self.length = 0
+        self.position = 0
+        self.speed = 1.0
+        self.playing = False
+        self.finished = False
+        self.device = None
+        self.scratch = None
+        # (start, end, (stems, frames, channels) copy of the region) while looping
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def load(self, stems, sample_rate):
+        """Replace the stems; each is a (frames, channels) int16 array."""
+        self.close()
+        with self.lock:
+            self.stems = list(stems)
+            self.sample_rate = sample_rate
+            self.channels = self.stems[0].shape[1]
+            self.gains = np.ones(len(self.stems), dtype=np.float32)
+            self.targets = self.gains.copy()
+            self.length = max(len(stem) for stem in self.stems)
+            self.position = 0
+            self.speed = 1.0
+            self.playing = False
+            self.finished = False
+            self.loop = None
+
+    def set_stems(self, stems, speed=1.0):
+        """Swap in the same stems rendered at another speed, keeping the place in the track, gains and device.
+
+        Any loop is cleared, since its copy belongs to the old renders.
+        """
+        with self.lock:
+            track_position = self.position * self.speed
+            self.stems = list(stems)
+            self.speed = speed
+            self.length = max(len(stem) for stem in self.stems)
+            self.position = min(int(round(track_position / speed)), self.length)
+            self.loop = None
+
+    def open(self):
+        """Open the output device, initially paused."""
+        if self.device is not None:
+            return
+        # Imported here so the app can start without waiting for pygame and SDL
+        import pygame
+        from pygame._sdl2.audio import AudioDevice, AUDIO_S16, get_audio_device_names
+        # SDL's audio subsystem is brought up by the mixer
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        self.device = AudioDevice(
+            devicename=get_audio_device_names(False)[0],
+            iscapture=False,
+            frequency=self.sample_rate,
+            audioformat=AUDIO_S16,
+            numchannels=self.channels,
+            chunksize=self.block_size,
+            allowed_changes=0,
+            callback=self.callback,
+        )
+
+    def close(self):
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+
+    def play(self):
+        self.open()
+        self.finished = False
+        self.playing = True
+        self.device.pause(0)
+
+    def pause(self):
+        """Stop producing audio; the device is paused too so no callbacks run while idle."""
+        self.playing = False
+        if self.device is not None:
+            self.device.pause(1)
+
+    def stop(self):
+        self.pause()
+        self.seek(0.0)
+
+    def seek(self, seconds):
+        with self.lock:
+            self.position = min(max(int(seconds * self.sample_rate / self.speed), 0), self.length)
+            self.finished = False
+
+    def set_loop(self, start_seconds, end_seconds):
+        """Loop between two points, copying the region out of the stems once."""
+        start = min(max(int(start_seconds * self.sample_rate / self.speed), 0), self.length)
+        end = min(max(int(end_seconds * self.sample_rate / self.speed), 0), self.length)
+        if end <= start:
+            raise ValueError("The loop must end after it starts.")
+        region = np.zeros((len(self.stems), end - start, self.channels), dtype=np.int16)
+        for i, stem in enumerate(self.stems):
+            segment = stem[start:end]
+            region[i, :len(segment)] = segment
+        with self.lock:
+            self.loop = (start, end, region)
+            self.finished = False
+
+    def clear_loop(self):
+        with self.lock:
+            self.loop = None
+
+    def set_gain(self, index, gain):
+        """Set a stem's target gain; cheap enough to call on every slider event."""
+        self.targets[index] = gain
+
+    def gain_curves(self, frames):
+        """Per-sample (stems, frames) gains ramping towards the targets, or None if none are moving."""
+        targets = self.targets.copy()
+        delta = targets - self.gains
+        if not delta.any():
+            return None
+        ramp_frames = max(self.ramp_seconds * self.sample_rate, 1)
+        steps = np.arange(1, frames + 1, dtype=np.float32) / ramp_frames
+        curves = self.gains[:, None] + np.sign(delta)[:, None] * np.minimum(steps, np.abs(delta)[:, None])
+        # Land exactly on a reached target rather than a rounding error away from it
+        self.gains = np.where(steps[-1] >= np.abs(delta), targets, curves[:, -1]).astype(np.float32)
+        return curves
+
+    def position_seconds(self):
+        return self.position * self.speed / self.sample_rate
+
+    def length_seconds(self):
+        return self.length * self.speed / self.sample_rate
+
+    def fill(self, block):
+        """Copy the next frames of every stem into block, wrapping inside the loop; returns the new position."""
+        frames = block.shape[1]
+        position = self.position
+        written = 0
+        while written < frames:
+            if self.loop is not None and self.loop[0] <= position < self.loop[1]:
+                loop_start, loop_end, region = self.loop
+                # All the remaining frames at once, wrapping as often as the loop is short
+                offsets = (position - loop_start + np.arange(frames - written)) % (loop_end - loop_start)
+                block[:, written:] = region[:, offsets]
+                return loop_start + (offsets[-1] + 1) % (loop_end - loop_start)
+            # Play up to the loop start if it's ahead of us, otherwise to the end of the track
+            stop = self.loop[0] if self.loop is not None and position < self.loop[0] else self.length
+            count = min(frames - written, stop - position)
+            if count <= 0:
+                block[:, written:] = 0
+                break
+            for i, stem in enumerate(self.stems):
+                # Stems still decoding or rendering play silence where they haven't got to yet
+                # rather than holding up the callback (and the lock) until they do
+                segment = (stem.available(position, position + count) if hasattr(stem, "available")
+                           else stem[position:position + count])
+                block[i, written:written + len(segment)] = segment
+                block[i, written + len(segment):written + count] = 0
+            written += count
+            position += count
+        return position
+
+    def render(self, frames):
+        """Mix the next block of frames and advance the position; returns float32 samples."""
+        with self.lock:
+            if self.scratch is None or self.scratch.shape != (len(self.stems), frames, self.channels):
+                self.scratch = np.zeros((len(self.stems), frames, self.channels), dtype=np.float32)
+            block = self.scratch
+            end = self.fill(block)
+            curves = self.gain_curves(frames)
+            if curves is None:
+                mix = np.tensordot(self.gains, block, axes=1)
+            else:
+                mix = np.einsum("sf,sfc->fc", curves, block)
+            self.position = end
+            if end >= self.length:
+                self.finished = True
+                self.playing = False
+        return mix
+
+    def callback(self, device, stream):
+        """Audio device callback: fill stream with the next block of interleaved int16 samples."""
+        frames = len(stream) // (2 * self.channels)
+        if not self.playing:
+            stream[:] = bytes(len(stream))
+            return
+        mix = self.render(frames)
+        stream[:] = np.clip(mix, -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+
+BASE_BLOCK = 256
+CHUNK_BLOCKS = 4096
+PEAKS_VERSION = 1
+
+
+class PeakIndex:
+    """Multi-resolution min/max peaks of a stem for drawing waveform overviews.
+
+    Level 0 holds one (min, max) pair per BASE_BLOCK frames and every further level halves
+    the previous one, so any zoom can be drawn from the level whose bucket is closest to one
+    pixel column, touching at most a couple of buckets per column.
+    """
+
+    def __init__(self, levels, base_block, frames):
+        self.levels = levels
+        self.base_block = base_block
+        self.frames = frames
+
+    @classmethod
+    def compute(cls, samples, base_block=BASE_BLOCK):
+        """Build the index from a (frames, channels) int16 array, chunk by chunk to bound memory."""
+        frames, channels = samples.shape
+        mins = []
+        maxs = []
+        chunk = base_block * CHUNK_BLOCKS
+        for start in range(0, frames, chunk):
+            block = np.asarray(samples[start:start + chunk])
+            whole = len(block) // base_block * base_block
+            buckets = block[:whole].reshape(-1, base_block * channels)
+            mins.append(buckets.min(axis=1))
+            maxs.append(buckets.max(axis=1))
+            if whole < len(block):
+                mins.append(block[whole:].min(keepdims=True).ravel())
+                maxs.append(block[whole:].max(keepdims=True).ravel())
+        level_min = np.concatenate(mins).astype(np.float32) / 32768 if mins else np.zeros(1, np.float32)
+        level_max = np.concatenate(maxs).astype(np.float32) / 32768 if maxs else np.zeros(1, np.float32)
+
+        levels = [(level_min, level_max)]
+        while len(level_min) > 1:
+            if len(level_min) % 2:
+                level_min = np.append(level_min, level_min[-1])
+                level_max = np.append(level_max, level_max[-1])
+            level_min = np.minimum(level_min[0::2], level_min[1::2])
+            level_max = np.maximum(level_max[0::2], level_max[1::2])
+            levels.append((level_min, level_max))
+        return cls(levels, base_block, frames)
+
+    def save(self, path, source_path):
+        stat = os.stat(source_path)
+        arrays = {}
+        for i, (level_min, level_max) in enumerate(self.levels):
+            arrays[f"min{i}"] = level_min
+            arrays[f"max{i}"] = level_max
+        with open(path, "wb") as f:
+            np.savez(f, version=PEAKS_VERSION, base_block=self.base_block, frames=self.frames,
+                     source_size=stat.st_size, source_mtime=stat.st_mtime, **arrays)
+
+    @classmethod
+    def load(cls, path, source_path):
+        """Load a saved index, or return None if it's missing or older than its stem."""
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return None
+        with data:
+            stat = os.stat(source_path)
+            if (int(data["version"]) != PEAKS_VERSION or int(data["source_size"]) != stat.st_size
+                    or float(data["source_mtime"]) != stat.st_mtime):
+                return None
+            count = sum(1 for name in data.files if name.startswith("min"))
+            levels = [(data[f"min{i}"], data[f"max{i}"]) for i in range(count)]
+            return cls(levels, int(data["base_block"]), int(data["frames"]))
+
+    @classmethod
+    def for_stem(cls, stem_path, samples):
+        """Load the index saved next to a stem, computing and saving it on first use."""
+        peaks_path = stem_path + ".peaks.npz"
+        index = cls.load(peaks_path, stem_path)
+        if index is None:
+            index = cls.compute(samples)
+            try:
+                index.save(peaks_path, stem_path)
+            except OSError:
+                # Read-only folders still get a waveform, just not a saved one
+                pass
+        return index
+
+    def columns(self, start_frame, end_frame, width):
+        """Per-pixel-column (mins, maxs) for frames [start_frame, end_frame) drawn width columns wide."""
+        frames_per_column = max((end_frame - start_frame) / width, 1)
+        # Coarsest level whose buckets are no wider than a column
+        level = min(int(np.log2(max(frames_per_column / self.base_block, 1))), len(self.levels) - 1)
+        level_min, level_max = self.levels[level]
+        bucket = self.base_block * 2 ** level
+        last = max(min(int(np.ceil(end_frame / bucket)), len(level_min)), 1)
+        first = min(int(start_frame // bucket), last - 1)
+        starts = np.linspace(start_frame, end_frame, width, endpoint=False) // bucket
+        starts = np.clip(starts.astype(np.int64), first, last - 1) - first
+        # Each column reduces the buckets up to the next column's start, at most a couple of them
+        mins = np.minimum.reduceat(level_min[first:last], starts)
+        maxs = np.maximum.reduceat(level_max[first:last], starts)
+        return mins, maxs
@@ -0,0 +1,60 @@
+import os
+import sys
+
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if the platform can't tell us."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        return peak / MB if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / MB
+
+
+def rss_mb():
+    """Current resident memory of this process in MB, or None if the platform can't tell us."""
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / MB
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / MB
+
+
+def io_bytes():
+    """Bytes (read, written) to storage by this process so far, or (None, None)."""
+    if os.path.exists("/proc/self/io"):
+        counters = {}
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, value = line.split(":")
+                counters[key] = int(value)
+        return counters["read_bytes"], counters["write_bytes"]
+    try:
+        import psutil
+    except ImportError:
+        return None, None
+    counters = psutil.Process().io_counters()
+    return counters.read_bytes, counters.write_bytes
+
+
+def directory_size(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from stem_io import find_stems, open_stem, open_stem_writer, stem_model, to_pcm16
+
+# Frames mixed per block, enough to keep NumPy busy without holding a whole track in memory
+BLOCK_FRAMES = 65536
+
+# Gain per stem; "*" sets the gain of every stem not listed, which is otherwise 1
+PRESETS = {
+    "karaoke": {"vocals": 0.0},
+    "acapella": {"*": 0.0, "vocals": 1.0},
+}
+
+CODECS = ("wav", "flac", "ogg", "mp3", "m4a")
+
+
+def preset_gains(names, preset):
+    default = preset.get("*", 1.0)
+    return [preset.get(name, default) for name in names]
+
+
+def parse_preset(text):
+    """Parse "name=stem:gain,stem:gain" into (name, {stem: gain})."""
+    name, _, spec = text.partition("=")
+    if not name or not spec:
+        raise ValueError(f"expected name=stem:gain,... but got {text!r}")
+    gains = {}
+    for item in spec.split(","):
+        stem, _, gain = item.partition(":")
+        gains[stem.strip()] = float(gain)
+    return name, gains
+
+
+def render_mix(stem_paths, gains, output_path, codec='wav', bitrate='192k', block_frames=BLOCK_FRAMES):
+    """Mix stems with fixed gains into one file, block by block, as fast as they can be read and encoded.
+
+    stem_paths maps stem name to file and gains lists one gain per stem in the same order.
+    """
+    start = time.perf_counter()
+    loaded = [open_stem(path) for path in stem_paths.values()]
+    sample_rate = loaded[0][1]
+    channels = loaded[0][0].shape[1]
+    if any(rate != sample_rate or samples.shape[1] != channels for samples, rate in loaded):
+        raise ValueError("Stems have different sample rates or channel counts.")
+    stems = [samples for samples, _ in loaded]
+    length = max(len(stem) for stem in stems)
+    # Fold the int16 scale into the gains so the mix comes out as float -1..1
+    scaled = np.asarray(gains, dtype=np.float32) / 32768
+    block = np.zeros((len(stems), block_frames, channels), dtype=np.float32)
+
+    writer = open_stem_writer(output_path, channels, sample_rate, codec, bitrate)
+    try:
+        for offset in range(0, length, block_frames):
+            frames = min(block_frames, length - offset)
+            for i, stem in enumerate(stems):
+                segment = stem[offset:offset + frames]
+                block[i, :len(segment)] = segment
+                block[i, len(segment):frames] = 0
+            writer.writeframes(to_pcm16(np.tensordot(scaled, block[:, :frames], axes=1)))
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    return {"output": output_path, "audio_s": length / sample_rate, "seconds": seconds,
+            "realtime_factor": length / sample_rate / max(seconds, 1e-9)}
+
+
+def collect_stem_folders(roots):
+    """Map every directory under the roots that holds a model's full set of stems to an output name.
+
+    Folders are named by their path relative to the root they were found under (or their
+    own name if given directly), so same-named tracks in different albums get separate
+    outputs. Names that still collide get a short hash of the folder's path.
+    """
+    names = {}
+    for root in roots:
+        root = os.path.abspath(root)
+        for folder, _, _ in os.walk(root):
+            if stem_model(find_stems(folder)):
+                name = os.path.relpath(folder, root) if folder != root else os.path.basename(root)
+                names.setdefault(os.path.abspath(folder), name)
+    counts = Counter(os.path.normcase(name) for name in names.values())
+    for folder, name in names.items():
+        if counts[os.path.normcase(name)] > 1:
+            names[folder] = f"{name}-{hashlib.sha1(folder.encode()).hexdigest()[:8]}"
+    return dict(sorted(names.items()))
+
+
+def render_one(folder, preset_name, preset, output_path, codec='wav', bitrate='192k'):
+    start = time.perf_counter()
+    try:
+        stem_paths = find_stems(folder)
+        result = render_mix(stem_paths, preset_gains(stem_paths, preset), output_path, codec, bitrate)
+    except Exception as e:
+        return {"input": folder, "preset": preset_name, "status": "failed", "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(), "seconds": time.perf_counter() - start}
+    return dict(result, input=folder, preset=preset_name, status="ok")
+
+
+def render_batch(folders, presets, output_root, jobs=1, codec='wav', bitrate='192k'):
+    """Render every preset of every stem folder to <output_root>/<name>/<preset>.<codec> across worker processes.
+
+    folders maps each stem folder to its output name, as collect_stem_folders returns.
+    """
+    failures = []
+    done = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for folder, output_name in folders.items():
+            output_directory = os.path.join(output_root, output_name)
+            os.makedirs(output_directory, exist_ok=True)
+            for name, preset in presets.items():
+                output_path = os.path.join(output_directory, f"{name}.{codec}")
+                future = executor.submit(render_one, folder, name, preset, output_path, codec, bitrate)
+                futures[future] = (folder, name)
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                folder, name = futures[future]
+                result = {"input": folder, "preset": name, "status": "failed", "error": f"worker crashed: {e}"}
+            done += 1
+            if result["status"] == "ok":
+                print(f"[{done}/{len(futures)}] ok {result['output']} ({result['realtime_factor']:.0f}x real time)")
+            else:
+                failures.append(result)
+                print(f"[{done}/{len(futures)}] FAILED {result['input']} ({result['preset']}): {result['error']}",
+                      file=sys.stderr)
+
+    print(f"Rendered {done - len(failures)} of {done} mix(es) in {time.perf_counter() - start:.1f}s, "
+          f"{len(failures)} failed")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render remixes of separated stems to files without playback.")
+    parser.add_argument("folders", nargs="+", help="stem folders, or directories searched for them")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="root directory for the rendered mixes")
+    parser.add_argument("-p", "--preset", action="append", default=[],
+                        help=f"built-in preset ({', '.join(PRESETS)}) or name=stem:gain,... (repeatable)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--codec", default="wav", choices=CODECS, help="output format")
+    parser.add_argument("--bitrate", default="192k", help="bitrate for lossy formats")
+    args = parser.parse_args(argv)
+
+    presets = {}
+    for text in args.preset or list(PRESETS):
+        if text in PRESETS:
+            presets[text] = PRESETS[text]
+        else:
+            try:
+                name, gains = parse_preset(text)
+            except ValueError as e:
+                parser.error(str(e))
+            presets[name] = gains
+
+    folders = collect_stem_folders(args.folders)
+    if not folders:
+        parser.error("no stem folders found")
+    failures = render_batch(folders, presets, os.path.abspath(args.output), jobs=args.jobs,
+                            codec=args.codec, bitrate=args.bitrate)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger("audioslicer.service")
+
+DEFAULT_ADDRESS = "http://127.0.0.1:8765"
+# Clients use the service when this names its address: an http:// URL or a Unix socket path
+ADDRESS_ENV = "AUDIOSLICER_SERVICE"
+PCM_BLOCK_FRAMES = 65536
+# Windows builds of Python have no Unix sockets, so the service only listens on TCP there
+UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+
+
+def model_directory(model):
+    """Where Spleeter looks for a model's weights, e.g. pretrained_models/2stems for spleeter:2stems."""
+    return os.path.join(os.environ.get("MODEL_PATH", "pretrained_models"), model.split(":", 1)[-1])
+
+
+def check_model_available(model):
+    """Refuse models that aren't on disk, since Spleeter would otherwise try to download them."""
+    if not os.path.isdir(model_directory(model)):
+        raise LookupError(f"{model} is not installed in {model_directory(model)}; "
+                          "download it once or point MODEL_PATH at a copy")
+
+
+class SeparationRequest:
+    def __init__(self, input_path, model='spleeter:2stems', codec='wav', bitrate='192k', output=None):
+        self.input_path = input_path
+        self.model = model
+        self.codec = codec
+        self.bitrate = bitrate
+        self.output = output
+        self.future = Future()
+
+
+class SeparationService:
+    """Keeps models resident in one process and separates concurrent requests together.
+
+    Requests queue up for a batch thread, which waits up to batch_wait seconds for more
+    requests for the same model and then separates them in one model invocation.
+    Results go to the stem cache unless a request names its own output directory.
+    """
+
+    def __init__(self, pool=None, cache=None, max_batch=4, batch_wait=0.1):
+        from separator_pool import get_pool
+        from stem_cache import get_cache
+        self.pool = pool or get_pool()
+        self.cache = cache or get_cache()
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.requests = queue.Queue()
+        self.served = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, request):
+        check_model_available(request.model)
+        if not os.path.isfile(request.input_path):
+            raise FileNotFoundError(f"No such file: {request.input_path}")
+        self.requests.put(request)
+        return request.future
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.requests.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            models = {}
+            for request in batch:
+                models.setdefault(request.model, []).append(request)
+            for model, requests in models.items():
+                self.process(model, requests)
+            self.served += len(batch)
+
+    def process(self, model, requests):
+        from instrument import SliceTrace
+        from slicer import decode_audio, stem_cache_key, traced
+
+        pending = []
+        for request in requests:
+            try:
+                if request.output is None:
+                    # Batched requests go through the model whole, silences included
+                    request.key = stem_cache_key(self.cache, request.input_path, model, None, request.codec,
+                                                 request.bitrate, skip_silence=False)
+                    directory = self.cache.get(request.key)
+                    if directory is not None:
+                        request.future.set_result(directory)
+                        continue
+                pending.append(request)
+            except Exception as e:
+                request.future.set_exception(e)
+        if not pending:
+            return
+
+        trace = SliceTrace(inputs=[request.input_path for request in pending], model=model, batch=len(pending),
+                           service=True)
+
+        def run():
+            with trace.stage("model_load"):
+                self.pool.get(model)
+            decoded = []
+            for request in pending:
+                try:
+                    with trace.stage("decode"):
+                        decoded.append((request, decode_audio(request.input_path)))
+                except Exception as e:
+                    # An unreadable file only fails its own request
+                    request.future.set_exception(e)
+            if not decoded:
+                return
+            with trace.stage("inference"):
+                separated = self.pool.separate_batch([waveform for _, waveform in decoded], model=model)
+            for (request, _), stems in zip(decoded, separated):
+                with trace.stage("write"):
+                    request.future.set_result(self.write(request, stems))
+
+        try:
+            traced(trace, run)
+        except Exception as e:
+            for request in pending:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    def write(self, request, stems):
+        from slicer import write_stems
+        if request.output is not None:
+            base_name = os.path.splitext(os.path.basename(request.input_path))[0]
+            directory = os.path.join(request.output, base_name, base_name)
+            write_stems(stems, directory, codec=request.codec, bitrate=request.bitrate)
+            return directory
+        metadata = {"source": os.path.abspath(request.input_path), "model": request.model, "window": None,
+                    "codec": request.codec}
+        return self.cache.store(request.key, lambda directory: write_stems(stems, directory, codec=request.codec,
+                                                                           bitrate=request.bitrate), metadata)
+
+    def health(self):
+        return {"status": "ok", "models": sorted(self.pool.separators), "queued": self.requests.qsize(),
+                "served": self.served, "latency": self.pool.stats()}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """GET /health, POST /separate for stem paths and POST /pcm for one stem as raw 16-bit PCM."""
+
+    server_version = "audioslicer"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.server.service.health())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/separate", "/pcm"):
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            request = SeparationRequest(body["input"], body.get("model", 'spleeter:2stems'), body.get("codec", 'wav'),
+                                        body.get("bitrate", '192k'), body.get("output"))
+            future = self.server.service.submit(request)
+        except (ValueError, KeyError, LookupError, OSError) as e:
+            self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        try:
+            stems_directory = future.result()
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        from stem_io import find_stems
+        stems = find_stems(stems_directory)
+        if self.path == "/separate":
+            self.send_json(200, {"stems_directory": stems_directory, "stems": stems})
+        elif body.get("stem") not in stems:
+            self.send_json(400, {"error": f"No stem {body.get('stem')!r}; have {', '.join(stems)}"})
+        else:
+            self.send_pcm(stems[body["stem"]])
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_pcm(self, path):
+        """Stream a stem as interleaved little-endian int16, block by block."""
+        import numpy as np
+        from stem_io import open_stem
+        samples, sample_rate = open_stem(path)
+        frames, channels = samples.shape
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(frames * channels * 2))
+        self.send_header("X-Sample-Rate", str(sample_rate))
+        self.send_header("X-Channels", str(channels))
+        self.end_headers()
+        for start in range(0, frames, PCM_BLOCK_FRAMES):
+            self.wfile.write(np.asarray(samples[start:start + PCM_BLOCK_FRAMES], dtype="<i2").tobytes())
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+if UNIX_SOCKETS:
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            request, _ = super().get_request()
+            # BaseHTTPRequestHandler expects a (host, port) client address
+            return request, ("local", 0)
+
+    class UnixHTTPConnection(http.client.HTTPConnection):
+        def __init__(self, socket_path, timeout=None):
+            super().__init__("localhost", timeout=timeout)
+            self.socket_path = socket_path
+
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+
+
+class ServiceError(RuntimeError):
+    """The service answered, but couldn't separate the track."""
+
+
+class SeparationClient:
+    """Talks to a running separation service; needs nothing beyond the standard library."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        self.address = address
+        self.timeout = timeout
+
+    def connect(self):
+        if self.address.startswith("http://"):
+            url = urlparse(self.address)
+            return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+        if not UNIX_SOCKETS:
+            raise OSError(f"Unix sockets aren't available here; set {ADDRESS_ENV} to an http:// address")
+        return UnixHTTPConnection(self.address, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        """Send a request and return (connection, response); the caller closes the connection."""
+        connection = self.connect()
+        data = None if body is None else json.dumps(body).encode()
+        headers = {} if data is None else {"Content-Type": "application/json"}
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        if response.status != 200:
+            try:
+                error = json.loads(response.read()).get("error")
+            except ValueError:
+                error = response.reason
+            connection.close()
+            raise ServiceError(error)
+        return connection, response
+
+    def json(self, method, path, body=None):
+        connection, response = self.request(method, path, body)
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    def health(self):
+        return self.json("GET", "/health")
+
+    def separate(self, input_path, model='spleeter:2stems', codec='wav', bitrate='192k', output=None):
+        """Separate a track through the service and return the directory holding its stems."""
+        body = {"input": os.path.abspath(input_path), "model": model, "codec": codec, "bitrate": bitrate,
+                "output": None if output is None else os.path.abspath(output)}
+        return self.json("POST", "/separate", body)["stems_directory"]
+
+    def stream_pcm(self, input_path, stem, model='spleeter:2stems', block_size=PCM_BLOCK_FRAMES * 4):
+        """Return (sample_rate, channels, chunks) where chunks yields the stem as int16 PCM bytes."""
+        connection, response = self.request("POST", "/pcm", {"input": os.path.abspath(input_path), "model": model,
+                                                              "stem": stem})
+
+        def chunks():
+            try:
+                while True:
+                    chunk = response.read(block_size)
+                    if not chunk:
+                        return
+                    yield chunk
+            finally:
+                connection.close()
+
+        return int(response.getheader("X-Sample-Rate")), int(response.getheader("X-Channels")), chunks()
+
+
+def service_client():
+    """A client for the service named by AUDIOSLICER_SERVICE, or None to slice in-process."""
+    address = os.environ.get(ADDRESS_ENV)
+    return SeparationClient(address) if address else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve stem separation to local clients from one resident model.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (keep to loopback)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-m", "--model", action="append", default=[],
+                        help="model to load at startup (repeatable; others load on first request)")
+    parser.add_argument("--max-batch", type=int, default=4, help="most requests separated in one model invocation")
+    parser.add_argument("--batch-wait", type=float, default=0.1,
+                        help="seconds to wait for further requests before separating a batch")
+    parser.add_argument("--threads", type=int, help="TensorFlow intra-op threads (default: all cores)")
+    args = parser.parse_args(argv)
+    if args.socket and not UNIX_SOCKETS:
+        parser.error("--socket needs Unix sockets, which this platform doesn't have; use --host/--port")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.threads:
+        from separator_pool import configure_cpu_threads
+        configure_cpu_threads(args.threads, 2)
+    service = SeparationService(max_batch=args.max_batch, batch_wait=args.batch_wait)
+    for model in args.model:
+        check_model_available(model)
+        service.pool.get(model)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, ServiceHandler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+        address = f"http://{args.host}:{server.server_address[1]}"
+    server.service = service
+    logger.info(f"Serving separation on {address} (set {ADDRESS_ENV}={address} for the GUI)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger("audioslicer.pool")
+
+# Rough resident size of a loaded model, used to enforce the memory cap
+MODEL_MEMORY_MB = {
+    'spleeter:2stems': 300,
+    'spleeter:4stems': 550,
+    'spleeter:5stems': 650,
+}
+DEFAULT_MODEL_MEMORY_MB = 650
+
+# Spleeter cuts the spectrogram into 512-frame segments of 1024-sample hops and runs them as one
+# batch, so tracks joined on these boundaries are cut into segments much as they would be on their own
+BATCH_ALIGN_SAMPLES = 512 * 1024
+# Silence after each joined track, a whole STFT frame so no frame spans two tracks
+BATCH_GAP_SAMPLES = 4096
+# Intra-op threads per model beyond which Spleeter on CPU gains little
+THREADS_PER_MODEL = 4
+
+
+def cpu_thread_defaults(cores=None):
+    """Return (processes, intra_op_threads, inter_op_threads) that fill a CPU-only machine's cores."""
+    cores = cores or os.cpu_count() or 1
+    processes = max(1, cores // THREADS_PER_MODEL)
+    return processes, max(1, cores // processes), 2
+
+
+def configure_cpu_threads(intra_op, inter_op):
+    """Fix TensorFlow's thread pool sizes for this process; call before the first model loads."""
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(intra_op)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(inter_op)
+    os.environ["OMP_NUM_THREADS"] = str(intra_op)
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        # TensorFlow only accepts these before it has run anything
+        logger.warning(f"Could not set TensorFlow thread counts: {e}")
+
+
+def latency_stats(latencies):
+    """Summarise {model: [(kind, seconds), ...]} as {model: {kind: {"n", "mean_s", "min_s"}}}."""
+    stats = {}
+    for model, samples in latencies.items():
+        for kind in ('cold', 'warm'):
+            times = [t for k, t in samples if k == kind]
+            if times:
+                stats.setdefault(model, {})[kind] = {"n": len(times), "mean_s": round(sum(times) / len(times), 3),
+                                                     "min_s": round(min(times), 3)}
+    return stats
+
+
+def latency_report(latencies):
+    """Summarise cold and warm separation latency per model, one line each."""
+    return "\n".join(f"{model} {kind}: n={s['n']} mean={s['mean_s']:.2f}s min={s['min_s']:.2f}s"
+                     for model, kinds in latency_stats(latencies).items() for kind, s in kinds.items())
+
+
+class SeparatorPool:
+    """Keeps Spleeter separators warm between slices, keyed by stem configuration.
+
+    Models unused for idle_timeout seconds are released by a background timer that runs
+    while any model is loaded.
+    """
+
+    def __init__(self, memory_cap_mb=1500, idle_timeout=600.0, multiprocess=True):
+        self.memory_cap_mb = memory_cap_mb
+        self.idle_timeout = idle_timeout
+        self.multiprocess = multiprocess
+        self.separators = {}
+        self.last_used = {}
+        self.latencies = {}
+        self.idle_timer = None
+        self.lock = threading.RLock()
+
+    def get(self, model='spleeter:2stems'):
+        """Return a warm separator for the model, loading it on first use."""
+        with self.lock:
+            separator = self.separators.get(model)
+            if separator is None:
+                self.make_room(MODEL_MEMORY_MB.get(model, DEFAULT_MODEL_MEMORY_MB))
+                from spleeter.separator import Separator
+                separator = Separator(model, multiprocess=self.multiprocess)
+                # Spleeter only builds its graph and restores weights on the first separation
+                separator.separate(np.zeros((44100, 2), dtype=np.float32))
+                self.separators[model] = separator
+                self.start_idle_timer()
+            self.last_used[model] = time.monotonic()
+            return separator
+
+    def separate(self, waveform, model='spleeter:2stems'):
+        """Separate an in-memory waveform, returning a dict of stem name to waveform."""
+        return self.run(model, lambda separator: separator.separate(waveform))
+
+    def separate_batch(self, waveforms, model='spleeter:2stems'):
+        """Separate several waveforms in one model invocation, returning one stem dict per waveform.
+
+        The waveforms are joined with silence between them, each starting on a segment boundary,
+        and the stems are cut back apart afterwards.
+        """
+        offsets = []
+        padded = []
+        position = 0
+        for waveform in waveforms:
+            if waveform.shape[1] == 1:
+                # Spleeter upmixes mono itself, but joined tracks need matching channels
+                waveform = np.tile(waveform, (1, 2))
+            length = len(waveform) + BATCH_GAP_SAMPLES
+            length += -length % BATCH_ALIGN_SAMPLES
+            offsets.append(position)
+            padded.append(np.pad(waveform, ((0, length - len(waveform)), (0, 0))))
+            position += length
+        stems = self.separate(np.concatenate(padded), model=model)
+        return [{name: stem[offset:offset + len(waveform)] for name, stem in stems.items()}
+                for offset, waveform in zip(offsets, waveforms)]
+
+    def separate_to_file(self, audio_path, output_directory, model='spleeter:2stems', **kwargs):
+        """Separate a file with a pooled separator."""
+        self.run(model, lambda separator: separator.separate_to_file(audio_path, output_directory, **kwargs))
+
+    def run(self, model, action):
+        """Call action with the model's separator and record cold/warm latency."""
+        with self.lock:
+            kind = 'warm' if model in self.separators else 'cold'
+            start = time.perf_counter()
+            result = action(self.get(model))
+            elapsed = time.perf_counter() - start
+            self.latencies.setdefault(model, []).append((kind, elapsed))
+            self.last_used[model] = time.monotonic()
+        logger.debug(f"Separation ({model}, {kind}): {elapsed:.2f}s")
+        return result
+
+    def memory_mb(self):
+        return sum(MODEL_MEMORY_MB.get(model, DEFAULT_MODEL_MEMORY_MB) for model in self.separators)
+
+    def make_room(self, needed_mb):
+        """Evict idle models, least recently used first, until needed_mb fits under the cap."""
+        with self.lock:
+            self.evict_idle()
+            for model in sorted(self.separators, key=self.last_used.get):
+                if self.memory_mb() + needed_mb <= self.memory_cap_mb:
+                    break
+                self.evict(model)
+
+    def evict_idle(self):
+        """Drop models that have not been used within idle_timeout seconds."""
+        now = time.monotonic()
+        with self.lock:
+            for model in list(self.separators):
+                if now - self.last_used.get(model, now) > self.idle_timeout:
+                    self.evict(model)
+
+    def start_idle_timer(self):
+        # Called with the lock held; the timer stops itself once no models are left
+        if self.idle_timer is None:
+            self.idle_timer = threading.Thread(target=self.release_idle, daemon=True)
+            self.idle_timer.start()
+
+    def release_idle(self):
+        while True:
+            time.sleep(min(self.idle_timeout / 4, 60.0))
+            with self.lock:
+                self.evict_idle()
+                if not self.separators:
+                    self.idle_timer = None
+                    return
+
+    def evict(self, model):
+        with self.lock:
+            if self.separators.pop(model, None) is not None:
+                logger.info(f"Released {model}")
+            self.last_used.pop(model, None)
+
+    def clear(self):
+        with self.lock:
+            self.separators.clear()
+            self.last_used.clear()
+
+    def snapshot(self):
+        # Not under the lock, which is held for the length of a separation
+        return {model: list(samples) for model, samples in list(self.latencies.items())}
+
+    def stats(self):
+        return latency_stats(self.snapshot())
+
+    def report(self):
+        """Summarise cold and warm separation latency per model."""
+        return latency_report(self.snapshot())
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide separator pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SeparatorPool()
+        return _pool
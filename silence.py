@@ -0,0 +1,105 @@
+import time
+import numpy as np
+from separator_pool import BATCH_ALIGN_SAMPLES, BATCH_GAP_SAMPLES
+from stem_io import MODEL_STEMS, STEM_ORDER
+
+SILENCE_DB = -50.0
+# Shorter pauses aren't worth a separate model invocation
+MIN_SILENCE_SECONDS = 5.0
+# Audio kept either side of an active region, so fades and breaths still go through the model
+PADDING_SECONDS = 0.25
+FRAME_SAMPLES = 1024
+CHUNK_FRAMES = 4096
+
+# The stem that takes the mix wherever the model is skipped, so the stems still sum to the track
+RESIDUAL_STEMS = ("accompaniment", "other")
+
+
+def frame_levels(waveform, frame=FRAME_SAMPLES):
+    """RMS level in dBFS of each frame of a (samples, channels) float waveform."""
+    channels = waveform.shape[1]
+    levels = []
+    for start in range(0, len(waveform), frame * CHUNK_FRAMES):
+        chunk = waveform[start:start + frame * CHUNK_FRAMES]
+        whole = len(chunk) // frame * frame
+        blocks = chunk[:whole].reshape(-1, frame * channels)
+        power = [np.einsum("ij,ij->i", blocks, blocks) / blocks.shape[1]]
+        if whole < len(chunk):
+            tail = chunk[whole:].ravel()
+            power.append([np.dot(tail, tail) / len(tail)])
+        levels.append(np.concatenate(power))
+    power = np.concatenate(levels) if levels else np.zeros(0)
+    return 10 * np.log10(power + 1e-12)
+
+
+def active_regions(waveform, sample_rate=44100, threshold_db=SILENCE_DB, min_silence=MIN_SILENCE_SECONDS,
+                   padding=PADDING_SECONDS, frame=FRAME_SAMPLES):
+    """Sample ranges [(start, end), ...] that need separating; silences shorter than min_silence are kept."""
+    active = frame_levels(waveform, frame) > threshold_db
+    if not active.any():
+        return []
+    pad = int(np.ceil(padding * sample_rate / frame))
+    if pad:
+        active = np.convolve(active, np.ones(2 * pad + 1), mode="same") > 0
+    edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = starts[1:] - ends[:-1] >= min_silence * sample_rate / frame
+    starts = np.concatenate([starts[:1], starts[1:][keep]])
+    ends = np.concatenate([ends[:-1][keep], ends[-1:]])
+    return [(int(start) * frame, min(int(end) * frame, len(waveform))) for start, end in zip(starts, ends)]
+
+
+def batch_cost(lengths):
+    """Samples the model runs over for one separate_batch call on pieces of these lengths."""
+    return sum(length + BATCH_GAP_SAMPLES + -(length + BATCH_GAP_SAMPLES) % BATCH_ALIGN_SAMPLES for length in lengths)
+
+
+def silent_stems(waveform, model):
+    """The stems of input with nothing above the threshold, without running the model, or None for unknown models."""
+    names = MODEL_STEMS.get(model)
+    residual = next((name for name in RESIDUAL_STEMS if names and name in names), None)
+    if residual is None:
+        return None
+    # Spleeter always writes stereo stems
+    stereo = np.tile(waveform, (1, 2)) if waveform.shape[1] == 1 else waveform
+    return {name: stereo.astype(np.float32) if name == residual else np.zeros(stereo.shape, dtype=np.float32)
+            for name in STEM_ORDER if name in names}
+
+
+def separate_active(pool, waveform, model='spleeter:2stems', sample_rate=44100, **options):
+    """Separate only the active regions of a waveform, leaving stems time-aligned with it.
+
+    Skipped regions are silent in every stem except the residual one (accompaniment or
+    other), which gets the input as-is. Returns (stems, report) where the report gives the
+    seconds skipped and an estimate of the inference time that saved, scaled from the
+    time the model took over the audio it did run on. Input that is silent throughout never
+    reaches the model, so it has no time to scale from and reports no estimate.
+    """
+    regions = active_regions(waveform, sample_rate, **options)
+    if not regions:
+        stems = silent_stems(waveform, model)
+        if stems is not None:
+            return stems, {"silence_skipped_s": len(waveform) / sample_rate, "inference_saved_s": 0.0}
+    cost = batch_cost([end - start for start, end in regions])
+    full_cost = batch_cost([len(waveform)])
+    if not regions or cost >= full_cost:
+        # Too little to skip to beat running the model over everything, or a silent input from an unknown model
+        return pool.separate(waveform, model=model), {"silence_skipped_s": 0.0, "inference_saved_s": 0.0}
+
+    start_time = time.perf_counter()
+    separated = pool.separate_batch([waveform[start:end] for start, end in regions], model=model)
+    elapsed = time.perf_counter() - start_time
+
+    channels = next(iter(separated[0].values())).shape[1]
+    stems = {name: np.zeros((len(waveform), channels), dtype=np.float32) for name in separated[0]}
+    residual = next((name for name in RESIDUAL_STEMS if name in stems), None)
+    if residual is not None:
+        stems[residual][:] = waveform
+    for (start, end), pieces in zip(regions, separated):
+        for name, piece in pieces.items():
+            stems[name][start:end] = piece[:end - start]
+
+    active = sum(end - start for start, end in regions)
+    return stems, {"silence_skipped_s": (len(waveform) - active) / sample_rate,
+                   "inference_saved_s": elapsed * (full_cost - cost) / cost}
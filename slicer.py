@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from pydub import AudioSegment
+from spleeter.audio.adapter import AudioAdapter
+from separator_pool import get_pool, SeparatorPool
+from stem_cache import get_cache
+import perf
+from instrument import SliceTrace, Cancelled
+from stem_io import open_stem_writer, to_pcm16
+from silence import separate_active
+
+SAMPLE_RATE = 44100
+
+
+def convert_mp3_to_wav(mp3_file, output_wav_file):
+    audio = AudioSegment.from_file(mp3_file)
+    audio.export(output_wav_file, format="wav")
+    return output_wav_file
+
+
+def decode_audio(input_path, sample_rate=SAMPLE_RATE):
+    """Decode a track straight into a float32 (samples, channels) waveform."""
+    waveform, _ = AudioAdapter.default().load(input_path, sample_rate=sample_rate)
+    return waveform
+
+
+def write_stems(stems, stems_directory, sample_rate=SAMPLE_RATE, codec='wav', bitrate='192k'):
+    """Write each separated stem waveform to <stems_directory>/<stem>.<codec>, encoding them in parallel."""
+    os.makedirs(stems_directory, exist_ok=True)
+    adapter = AudioAdapter.default()
+    paths = {name: os.path.join(stems_directory, f"{name}.{codec}") for name in stems}
+    # Each save runs its own ffmpeg process, so threads are enough to encode the stems concurrently
+    with ThreadPoolExecutor(max_workers=len(stems)) as executor:
+        futures = [executor.submit(adapter.save, paths[name], waveform, sample_rate, codec, bitrate)
+                   for name, waveform in stems.items()]
+        for future in futures:
+            future.result()
+    return paths
+
+
+def separate_waveform(pool, waveform, model='spleeter:2stems', trace=None, skip_silence=True):
+    """Separate a decoded waveform, keeping long silences out of the model if skip_silence.
+
+    The seconds skipped and estimated inference time saved are added to the trace's fields.
+    """
+    if not skip_silence:
+        return pool.separate(waveform, model=model)
+    stems, report = separate_active(pool, waveform, model=model)
+    if trace is not None:
+        for key, value in report.items():
+            trace.fields[key] = trace.fields.get(key, 0.0) + value
+    return stems
+
+
+def separate_into(input_path, stems_directory, model='spleeter:2stems', pool=None, window=None, trace=None,
+                  codec='wav', bitrate='192k', skip_silence=True):
+    """Run the decode, model load, inference and write stages for one track into stems_directory.
+
+    With a window (in seconds) the track is streamed through separate_streaming instead of
+    being decoded whole, which keeps memory flat for long recordings.
+    """
+    pool = pool or get_pool()
+    trace = trace or SliceTrace()
+    with trace.stage("model_load"):
+        pool.get(model)
+    if window:
+        separate_streaming(input_path, stems_directory, model=model, pool=pool, window=window, trace=trace,
+                           codec=codec, bitrate=bitrate, skip_silence=skip_silence)
+        return
+    with trace.stage("decode"):
+        waveform = decode_audio(input_path)
+    with trace.stage("inference"):
+        stems = separate_waveform(pool, waveform, model=model, trace=trace, skip_silence=skip_silence)
+    with trace.stage("write"):
+        write_stems(stems, stems_directory, codec=codec, bitrate=bitrate)
+
+
+def traced(trace, action):
+    """Run action, then log the trace's job summary with the outcome."""
+    try:
+        result = action()
+    except BaseException as e:
+        status = "cancelled" if isinstance(e, Cancelled) or not isinstance(e, Exception) else "failed"
+        trace.finish(status, f"{type(e).__name__}: {e}")
+        raise
+    trace.finish()
+    return result
+
+
+def stems_directory_for(input_path, output_root, name=None):
+    """Where a track's stems go: <output_root>/<name>/<file name>, with name defaulting to the file name."""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_root, name or base_name, base_name)
+
+
+def slice_file(input_path, output_root, model='spleeter:2stems', pool=None, window=None, progress=None,
+               codec='wav', bitrate='192k', skip_silence=True, name=None):
+    """Decode, separate and write the stems of a track, returning the directory holding them."""
+    stems_directory = stems_directory_for(input_path, output_root, name)
+    trace = SliceTrace(progress=progress, input=input_path, model=model, window=window)
+    traced(trace, lambda: separate_into(input_path, stems_directory, model=model, pool=pool, window=window, trace=trace,
+                                        codec=codec, bitrate=bitrate, skip_silence=skip_silence))
+    return stems_directory
+
+
+def slice_batch(input_paths, output_root, model='spleeter:2stems', pool=None, codec='wav', bitrate='192k', names=None):
+    """Slice several tracks with a single model invocation, returning their stems directories in order."""
+    pool = pool or get_pool()
+    names = names or [None] * len(input_paths)
+    trace = SliceTrace(inputs=list(input_paths), model=model, batch=len(input_paths))
+
+    def run():
+        with trace.stage("model_load"):
+            pool.get(model)
+        waveforms = []
+        for input_path in input_paths:
+            with trace.stage("decode"):
+                waveforms.append(decode_audio(input_path))
+        with trace.stage("inference"):
+            separated = pool.separate_batch(waveforms, model=model)
+        directories = []
+        for input_path, name, stems in zip(input_paths, names, separated):
+            directories.append(stems_directory_for(input_path, output_root, name))
+            with trace.stage("write"):
+                write_stems(stems, directories[-1], codec=codec, bitrate=bitrate)
+        return directories
+
+    return traced(trace, run)
+
+
+def stem_cache_key(cache, input_path, model='spleeter:2stems', window=None, codec='wav', bitrate='192k',
+                   skip_silence=True):
+    """The cache key of a track sliced with these settings; lossless codecs ignore the bitrate."""
+    return cache.key(input_path, model, {"sample_rate": SAMPLE_RATE, "window": window, "codec": codec,
+                                         "bitrate": None if codec in ("wav", "flac") else bitrate,
+                                         "skip_silence": skip_silence})
+
+
+def slice_cached(input_path, model='spleeter:2stems', pool=None, cache=None, window=None, progress=None,
+                 codec='wav', bitrate='192k', skip_silence=True):
+    """Return the stems directory for a track, separating it only on a stem cache miss.
+
+    progress, if given, is called with the name of each stage as it starts; raising from it
+    abandons the slice without leaving anything in the cache.
+    """
+    cache = cache or get_cache()
+    trace = SliceTrace(progress=progress, input=input_path, model=model, window=window)
+
+    def run():
+        with trace.stage("cache_lookup"):
+            key = stem_cache_key(cache, input_path, model, window, codec, bitrate, skip_silence)
+            stems_directory = cache.get(key)
+        if stems_directory is not None:
+            trace.fields["cache"] = "hit"
+            return stems_directory
+        trace.fields["cache"] = "miss"
+        metadata = {"source": os.path.abspath(input_path), "model": model, "window": window, "codec": codec}
+        return cache.store(key, lambda directory: separate_into(input_path, directory, model=model, pool=pool,
+                                                                window=window, trace=trace, codec=codec,
+                                                                bitrate=bitrate, skip_silence=skip_silence),
+                            metadata)
+
+    return traced(trace, run)
+
+
+def stream_windows(input_path, window_samples, overlap_samples, sample_rate=SAMPLE_RATE):
+    """Yield consecutive windows of the track that overlap by overlap_samples."""
+    adapter = AudioAdapter.default()
+    hop = window_samples - overlap_samples
+    offset = 0
+    while True:
+        chunk, _ = adapter.load(input_path, offset=offset / sample_rate,
+                                duration=window_samples / sample_rate, sample_rate=sample_rate)
+        if len(chunk) == 0:
+            return
+        yield chunk
+        if len(chunk) < window_samples:
+            return
+        offset += hop
+
+
+def stitch_windows(windows, overlap_samples):
+    """Cross-fade overlapping windows of separated stems into consecutive blocks.
+
+    The last overlap_samples of every window are held back and blended with the start of
+    the next one, so each block yielded can be appended to the output as-is.
+    """
+    fade_in = np.linspace(0.0, 1.0, overlap_samples + 2, dtype=np.float32)[1:-1, None]
+    tails = {}
+    for stems in windows:
+        blocks = {}
+        for name, chunk in stems.items():
+            tail = tails.get(name)
+            if tail is not None:
+                n = min(len(tail), len(chunk))
+                head = tail[:n] * (1.0 - fade_in[:n]) + chunk[:n] * fade_in[:n]
+                chunk = np.concatenate([head, chunk[n:]])
+            keep = max(len(chunk) - overlap_samples, 0)
+            blocks[name] = chunk[:keep]
+            tails[name] = chunk[keep:]
+        yield blocks
+    if tails:
+        yield tails
+
+
+def separate_streaming(input_path, stems_directory, model='spleeter:2stems', pool=None,
+                       window=30.0, overlap=1.0, sample_rate=SAMPLE_RATE, trace=None, codec='wav', bitrate='192k',
+                       skip_silence=True):
+    """Separate a track window by window and stream the stitched stems to the output files.
+
+    Compressed codecs are encoded by one ffmpeg process per stem, all running side by side.
+
+    Only one window of audio and its stems are held in memory at a time, however long the track.
+    """
+    pool = pool or get_pool()
+    window_samples = int(window * sample_rate)
+    overlap_samples = int(overlap * sample_rate)
+    if not 0 < overlap_samples < window_samples:
+        raise ValueError("overlap must be positive and shorter than the window")
+    os.makedirs(stems_directory, exist_ok=True)
+
+    trace = trace or SliceTrace()
+
+    def separate_windows():
+        windows = stream_windows(input_path, window_samples, overlap_samples, sample_rate)
+        while True:
+            with trace.stage("decode"):
+                chunk = next(windows, None)
+            if chunk is None:
+                return
+            with trace.stage("inference"):
+                stems = separate_waveform(pool, chunk, model=model, trace=trace, skip_silence=skip_silence)
+            yield stems
+
+    paths = {}
+    writers = {}
+    try:
+        for blocks in stitch_windows(separate_windows(), overlap_samples):
+            with trace.stage("write"):
+                for name, block in blocks.items():
+                    if name not in writers:
+                        paths[name] = os.path.join(stems_directory, f"{name}.{codec}")
+                        writers[name] = open_stem_writer(paths[name], block.shape[1], sample_rate, codec, bitrate)
+                    writers[name].writeframes(to_pcm16(block))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+
+def slice_file_two_step(input_path, output_root, model='spleeter:2stems', pool=None):
+    """The original pipeline: export a full WAV to disk, then separate_to_file it."""
+    pool = pool or get_pool()
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    output_directory = os.path.join(output_root, base_name)
+    os.makedirs(output_directory, exist_ok=True)
+
+    wav_path = os.path.join(output_directory, f"{base_name}.wav")
+    convert_mp3_to_wav(input_path, wav_path)
+
+    pool.separate_to_file(wav_path, output_directory, model=model)
+    return os.path.join(output_directory, base_name)
+
+
+def measure_pipeline(pipeline_name, input_path, output_root, model):
+    pipeline = {"in_memory": slice_file, "two_step": slice_file_two_step}[pipeline_name]
+    pool = SeparatorPool(multiprocess=False)
+    _, written_before = perf.io_bytes()
+    pipeline(input_path, output_root, model=model, pool=pool)
+    _, written_after = perf.io_bytes()
+    if written_before is None:
+        bytes_written = perf.directory_size(output_root)
+    else:
+        bytes_written = written_after - written_before
+    return {"pipeline": pipeline_name, "peak_rss_mb": perf.peak_rss_mb(), "bytes_written": bytes_written}
+
+
+def compare_pipelines(input_path, model='spleeter:2stems'):
+    """Run each pipeline in a fresh process and report its peak RSS and bytes written."""
+    results = []
+    for pipeline_name in ("two_step", "in_memory"):
+        with tempfile.TemporaryDirectory() as output_root, ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(measure_pipeline, pipeline_name, input_path, output_root, model).result())
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the two-step and in-memory slicing pipelines.")
+    parser.add_argument("input", help="track to slice")
+    parser.add_argument("-m", "--model", default="spleeter:2stems")
+    args = parser.parse_args()
+    print(json.dumps(compare_pipelines(args.input, args.model), indent=2))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import perf
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".audioslicer", "stems")
+CACHE_VERSION = 1
+META_FILE = "cache.json"
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StemCache:
+    """Separated stems keyed by the input's content hash plus the model and slicing config.
+
+    Each entry is a directory named after its key holding the stems and a cache.json with
+    its metadata, so entries can be added from several processes without a shared index.
+    Once the cache grows past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=20 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, input_path, model, config=None):
+        description = {"version": CACHE_VERSION, "input": file_digest(input_path), "model": model, "config": config or {}}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def read_meta(self, key):
+        """The metadata of a complete entry, or None if it's missing or was left half-written or half-removed."""
+        try:
+            with open(os.path.join(self.path(key), META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("key") == key else None
+
+    def get(self, key):
+        """Return the stems directory for key, or None on a miss."""
+        with self.lock:
+            meta = self.read_meta(key)
+            if meta is None:
+                return None
+            meta["last_used"] = time.time()
+            self.write_meta(self.path(key), meta)
+        return self.path(key)
+
+    def store(self, key, produce, metadata=None):
+        """Fill a new entry by calling produce(directory) and return its final directory.
+
+        The stems are produced in a scratch directory and moved into place afterwards, so a
+        crash mid-separation never leaves a half-written entry behind.
+        """
+        scratch = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            produce(scratch)
+            meta = dict(metadata or {}, key=key, size=perf.directory_size(scratch), created=time.time(), last_used=time.time())
+            self.write_meta(scratch, meta)
+            for attempt in range(2):
+                try:
+                    os.replace(scratch, self.path(key))
+                    break
+                except OSError:
+                    if self.read_meta(key) is not None:
+                        # Another process stored the same entry first
+                        shutil.rmtree(scratch, ignore_errors=True)
+                        break
+                    if attempt:
+                        raise
+                    # A stale entry, e.g. one whose removal failed while its stems were open
+                    shutil.rmtree(self.path(key), ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            try:
+                with open(os.path.join(self.root, name, META_FILE), encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda meta: meta["last_used"])
+            total = sum(meta["size"] for meta in entries)
+            for meta in entries:
+                if total <= self.max_bytes:
+                    break
+                if meta["key"] == keep:
+                    continue
+                # The metadata goes first, so an entry that can't be removed completely reads as a miss
+                try:
+                    os.remove(os.path.join(self.path(meta["key"]), META_FILE))
+                except OSError:
+                    continue
+                shutil.rmtree(self.path(meta["key"]), ignore_errors=True)
+                total -= meta["size"]
+
+    def write_meta(self, directory, meta):
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide stem cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StemCache()
+        return _cache
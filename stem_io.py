@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import struct
+import subprocess
+import threading
+import time
+import wave
+import numpy as np
+import perf
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Order stems are shown in, covering the 2, 4 and 5 stem Spleeter models
+STEM_ORDER = ("vocals", "drums", "bass", "piano", "other", "accompaniment")
+# The stems each model writes, which tell a stem folder apart from a folder of songs
+MODEL_STEMS = {
+    'spleeter:2stems': {"vocals", "accompaniment"},
+    'spleeter:4stems': {"vocals", "drums", "bass", "other"},
+    'spleeter:5stems': {"vocals", "drums", "bass", "piano", "other"},
+}
+# Preferred first when a stem exists in several formats
+STEM_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a")
+# ffmpeg encoders for the compressed stem formats
+FFMPEG_CODECS = {"flac": "flac", "ogg": "libvorbis", "mp3": "libmp3lame", "m4a": "aac"}
+
+
+def find_stems(folder):
+    """Map stem name to path for the files in a folder named after a stem, in STEM_ORDER."""
+    stems = {}
+    for file_name in os.listdir(folder):
+        name, extension = os.path.splitext(file_name)
+        extension = extension.lower()
+        if extension not in STEM_EXTENSIONS or name not in STEM_ORDER:
+            continue
+        current = stems.get(name)
+        if current is None or STEM_EXTENSIONS.index(extension) < STEM_EXTENSIONS.index(os.path.splitext(current)[1].lower()):
+            stems[name] = os.path.join(folder, file_name)
+
+    return {name: stems[name] for name in sorted(stems, key=STEM_ORDER.index)}
+
+
+def stem_model(stems):
+    """The model that writes exactly these stems, or None if they aren't a complete set."""
+    return next((model for model, names in MODEL_STEMS.items() if names == set(stems)), None)
+
+
+def read_wav_layout(path):
+    """Return (sample_rate, channels, bits_per_sample, format_tag, data_offset, data_size) of a WAV file."""
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{path} is not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                format_tag, channels, sample_rate = struct.unpack("<HHI", body[:8])
+                bits = struct.unpack("<H", body[14:16])[0]
+                if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (sample_rate, channels, bits, format_tag)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has data before its fmt chunk")
+                return fmt + (f.tell(), chunk_size)
+            else:
+                f.seek(chunk_size, 1)
+            # Chunks are word aligned
+            if chunk_size % 2:
+                f.seek(1, 1)
+
+
+def open_wav(path):
+    """Memory-map a 16-bit PCM WAV as a read-only (frames, channels) int16 array.
+
+    Nothing is read up front; pages are faulted in as playback and seeking touch them.
+    Returns (samples, sample_rate).
+    """
+    sample_rate, channels, bits, format_tag, offset, size = read_wav_layout(path)
+    if format_tag != WAVE_FORMAT_PCM or bits != 16:
+        raise ValueError(f"{path} is not 16-bit PCM")
+    file_size = os.path.getsize(path)
+    # Streamed writers may leave a placeholder data size
+    size = min(size, file_size - offset)
+    frames = size // (2 * channels)
+    samples = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(frames, channels))
+    return samples, sample_rate
+
+
+def stem_info(path):
+    """Return (sample_rate, channels, duration_s) of a stem without decoding it."""
+    if path.lower().endswith(".wav"):
+        sample_rate, channels, bits, _, offset, size = read_wav_layout(path)
+        size = min(size, os.path.getsize(path) - offset)
+        return sample_rate, channels, size / (bits // 8 * channels) / sample_rate
+    import ffmpeg
+    probe = ffmpeg.probe(path)
+    stream = next(s for s in probe["streams"] if s["codec_type"] == "audio")
+    return int(stream["sample_rate"]), int(stream["channels"]), float(stream.get("duration") or probe["format"]["duration"])
+
+
+class DecodedStem:
+    """A compressed stem decoded ahead of playback on a background ffmpeg pipe.
+
+    Behaves like the (frames, channels) int16 array open_wav returns. Slicing blocks only
+    when it asks for samples the decoder hasn't reached yet; available() never waits, so
+    playback can start as soon as the first blocks are decoded and never stalls on a seek.
+    """
+
+    def __init__(self, path, read_size=65536):
+        import ffmpeg
+        stream = next(s for s in ffmpeg.probe(path)["streams"] if s["codec_type"] == "audio")
+        self.path = path
+        self.sample_rate = int(stream["sample_rate"])
+        self.channels = int(stream["channels"])
+        frames = int(float(stream.get("duration") or ffmpeg.probe(path)["format"]["duration"]) * self.sample_rate) + 1
+        self.samples = np.zeros((frames, self.channels), dtype=np.int16)
+        self.decoded = 0
+        self.complete = False
+        self.error = None
+        self.read_size = read_size
+        self.condition = threading.Condition()
+        threading.Thread(target=self.decode, daemon=True).start()
+
+    def decode(self):
+        command = ["ffmpeg", "-loglevel", "error", "-i", self.path, "-f", "s16le", "-acodec", "pcm_s16le",
+                   "-ar", str(self.sample_rate), "-ac", str(self.channels), "pipe:1"]
+        frame_bytes = 2 * self.channels
+        pending = b""
+        try:
+            with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+                while True:
+                    data = process.stdout.read(self.read_size * frame_bytes)
+                    if not data:
+                        break
+                    data = pending + data
+                    usable = len(data) - len(data) % frame_bytes
+                    pending = data[usable:]
+                    block = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, self.channels)
+                    # Durations from the container are estimates, so grow if needed
+                    end = self.decoded + len(block)
+                    if end > len(self.samples):
+                        grown = np.concatenate([self.samples, np.zeros((end - len(self.samples), self.channels), np.int16)])
+                        with self.condition:
+                            self.samples = grown
+                    self.samples[self.decoded:end] = block
+                    with self.condition:
+                        self.decoded = end
+                        self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.complete = True
+                self.condition.notify_all()
+
+    @property
+    def shape(self):
+        return self.samples.shape
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, key):
+        stop = key.stop if isinstance(key, slice) and key.stop is not None else len(self.samples)
+        with self.condition:
+            self.condition.wait_for(lambda: self.decoded >= min(stop, len(self.samples)) or self.complete)
+            return self.samples[key]
+
+    def available(self, start, stop):
+        """The frames from start to stop decoded so far, which may be fewer than asked for."""
+        with self.condition:
+            return self.samples[start:max(start, min(stop, self.decoded))]
+
+
+def open_stem(path):
+    """Open a stem for playback: memory-mapped if it's 16-bit WAV, otherwise decoded ahead in the background."""
+    if path.lower().endswith(".wav"):
+        try:
+            return open_wav(path)
+        except ValueError:
+            pass
+    stem = DecodedStem(path)
+    return stem, stem.sample_rate
+
+
+def decode_wav(path):
+    """Fully decode a WAV with pydub into an int16 array, as load_segments used to."""
+    from pydub import AudioSegment
+    segment = AudioSegment.from_wav(path).set_sample_width(2)
+    return np.frombuffer(segment.raw_data, dtype=np.int16).reshape(-1, segment.channels), segment.frame_rate
+
+
+def open_wav_writer(path, channels, sample_rate=44100):
+    writer = wave.open(path, "wb")
+    writer.setnchannels(channels)
+    writer.setsampwidth(2)
+    writer.setframerate(sample_rate)
+    return writer
+
+
+class FfmpegWriter:
+    """Encodes the 16-bit PCM written to it into a compressed file through an ffmpeg process."""
+
+    def __init__(self, path, channels, sample_rate=44100, codec='flac', bitrate='192k'):
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate),
+                   "-ac", str(channels), "-i", "pipe:0", "-c:a", FFMPEG_CODECS[codec]]
+        if codec != "flac":
+            command += ["-b:a", bitrate]
+        self.path = path
+        self.process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+
+    def writeframes(self, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.path}")
+
+
+def open_stem_writer(path, channels, sample_rate=44100, codec='wav', bitrate='192k'):
+    if codec == 'wav':
+        return open_wav_writer(path, channels, sample_rate)
+    return FfmpegWriter(path, channels, sample_rate, codec, bitrate)
+
+
+def to_pcm16(waveform):
+    return (np.clip(waveform, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def report_load(paths, loader=open_wav, block_size=512):
+    """Time from opening the stems to the first mixed block, plus resident memory afterwards."""
+    from mix_engine import MixEngine
+    start = time.perf_counter()
+    loaded = [loader(path) for path in paths]
+    engine = MixEngine(block_size=block_size)
+    engine.load([samples for samples, _ in loaded], loaded[0][1])
+    engine.render(block_size)
+    return {
+        "loader": loader.__name__,
+        "duration_s": engine.length_seconds(),
+        "time_to_first_audio_ms": (time.perf_counter() - start) * 1000,
+        "rss_mb": perf.rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report time-to-first-audio and memory for loading stems.")
+    parser.add_argument("stems", nargs="+", help="stem WAV files, e.g. a 1 hour vocals.wav and accompaniment.wav")
+    parser.add_argument("--decode", action="store_true", help="measure full decoding instead of memory-mapping")
+    args = parser.parse_args()
+    print(json.dumps(report_load(args.stems, decode_wav if args.decode else open_wav), indent=2))
@@ -0,0 +1,290 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+N_FFT = 2048
+# Synthesis hop; N_FFT must be a whole number of hops for the overlap-add
+HOP = 512
+# Input frames fed to the stretcher at a time when rendering a stem
+BLOCK_FRAMES = 65536
+
+
+class PhaseVocoder:
+    """Streaming phase-vocoder time stretch; the output is rate times shorter than the input.
+
+    Each call to process() analyses every frame the buffered input allows in one batch of
+    FFTs and overlap-adds them with fixed synthesis hops, carrying phases and the overlap
+    tail over to the next call, so a stem can be fed through in blocks of any size.
+    """
+
+    def __init__(self, channels, rate, n_fft=N_FFT, hop=HOP):
+        self.channels = channels
+        self.n_fft = n_fft
+        self.hop = hop
+        self.analysis_hop = hop * rate
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        # Hann analysis and synthesis windows overlap-add to this constant
+        self.gain = float(np.sum(self.window ** 2)) / hop
+        self.omega = 2 * np.pi * np.arange(n_fft // 2 + 1) / n_fft
+        self.buffer = np.zeros((0, channels), dtype=np.float32)
+        # Input position of buffer[0], and of the next analysis frame (fractional)
+        self.start = 0
+        self.next_frame = 0.0
+        self.last_start = None
+        self.last_phase = None
+        self.phase = None
+        self.tail = np.zeros((n_fft // hop - 1, hop, channels), dtype=np.float32)
+
+    def process(self, block):
+        """Feed (frames, channels) float samples; returns the output that's now complete."""
+        self.buffer = np.concatenate([self.buffer, block])
+        last_possible = self.start + len(self.buffer) - self.n_fft
+        if last_possible < self.next_frame:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        count = int((last_possible - self.next_frame) // self.analysis_hop) + 1
+        starts = np.floor(self.next_frame + np.arange(count) * self.analysis_hop).astype(np.int64)
+
+        frames = sliding_window_view(self.buffer, self.n_fft, axis=0)[starts - self.start]
+        spectra = np.fft.rfft(frames * self.window, axis=-1)
+        magnitude = np.abs(spectra)
+        phase = np.angle(spectra)
+
+        # Instantaneous frequency from each frame's phase change since the previous frame
+        first = self.last_phase is None
+        previous_phase = np.concatenate([phase[:1] if first else self.last_phase[None], phase[:-1]])
+        previous_start = np.concatenate([starts[:1] if first else [self.last_start], starts[:-1]])
+        hops = (starts - previous_start)[:, None, None]
+        delta = phase - previous_phase - self.omega * hops
+        delta -= 2 * np.pi * np.round(delta / (2 * np.pi))
+        increments = (self.omega + delta / np.maximum(hops, 1)) * self.hop
+        if first:
+            increments[0] = 0
+        synthesis = (phase[0] if first else self.phase) + np.cumsum(increments, axis=0)
+        self.phase = np.mod(synthesis[-1], 2 * np.pi)
+        self.last_phase = phase[-1]
+        self.last_start = starts[-1]
+
+        output = np.fft.irfft(magnitude * np.exp(1j * synthesis), n=self.n_fft, axis=-1) * self.window
+        output = output.transpose(0, 2, 1).reshape(count, self.n_fft // self.hop, self.hop, self.channels)
+        overlap = len(self.tail)
+        blocks = np.zeros((count + overlap, self.hop, self.channels), dtype=np.float32)
+        blocks[:overlap] = self.tail
+        for j in range(overlap + 1):
+            blocks[j:j + count] += output[:, j]
+        self.tail = blocks[count:]
+
+        self.next_frame += count * self.analysis_hop
+        drop = int(self.next_frame) - self.start
+        self.buffer = self.buffer[drop:]
+        self.start += drop
+        return blocks[:count].reshape(-1, self.channels) / self.gain
+
+    def flush(self):
+        output = self.process(np.zeros((self.n_fft, self.channels), dtype=np.float32))
+        return np.concatenate([output, self.tail.reshape(-1, self.channels) / self.gain])
+
+
+class Resampler:
+    """Streaming linear-interpolation resampler reading the input every step samples."""
+
+    def __init__(self, channels, step):
+        self.channels = channels
+        self.step = step
+        self.buffer = np.zeros((0, channels), dtype=np.float32)
+        self.position = 0.0
+
+    def process(self, block):
+        self.buffer = np.concatenate([self.buffer, block])
+        last = len(self.buffer) - 2
+        if last < self.position:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        positions = self.position + np.arange(int((last - self.position) // self.step) + 1) * self.step
+        index = positions.astype(np.int64)
+        fraction = (positions - index)[:, None].astype(np.float32)
+        output = self.buffer[index] * (1 - fraction) + self.buffer[index + 1] * fraction
+        self.position = positions[-1] + self.step
+        drop = int(self.position)
+        self.buffer = self.buffer[drop:]
+        self.position -= drop
+        return output
+
+
+class Stretcher:
+    """Changes tempo by speed and pitch by semitones, independently of each other.
+
+    Pitch shifts stretch the time by the pitch ratio and resample it back, so the
+    output is always 1 / speed times the input's length.
+    """
+
+    def __init__(self, channels, speed=1.0, semitones=0.0):
+        ratio = 2 ** (semitones / 12)
+        self.vocoder = PhaseVocoder(channels, speed / ratio)
+        self.resampler = Resampler(channels, ratio) if semitones else None
+
+    def process(self, block):
+        output = self.vocoder.process(block)
+        return output if self.resampler is None else self.resampler.process(output)
+
+    def flush(self):
+        output = self.vocoder.flush()
+        if self.resampler is None:
+            return output
+        # Zeros to read the last samples against
+        return self.resampler.process(np.concatenate([output, np.zeros((2, output.shape[1]), np.float32)]))
+
+
+def stretch_blocks(samples, speed=1.0, semitones=0.0, block_frames=BLOCK_FRAMES):
+    """Yield a (frames, channels) int16 stem stretched and shifted, block by block.
+
+    The blocks add up to exactly round(len(samples) / speed) frames.
+    """
+    stretcher = Stretcher(samples.shape[1], speed, semitones)
+    remaining = int(round(len(samples) / speed))
+
+    def to_int16(output):
+        nonlocal remaining
+        output = output[:remaining]
+        remaining -= len(output)
+        return np.clip(output * 32768, -32768, 32767).astype(np.int16)
+
+    for start in range(0, len(samples), block_frames):
+        block = to_int16(stretcher.process(np.asarray(samples[start:start + block_frames], dtype=np.float32) / 32768))
+        if len(block):
+            yield block
+    block = to_int16(stretcher.flush())
+    if len(block):
+        yield block
+    if remaining > 0:
+        yield np.zeros((remaining, samples.shape[1]), dtype=np.int16)
+
+
+class StretchedStem:
+    """A stretched render of a stem, produced on a background thread.
+
+    Behaves like the (frames, channels) int16 arrays the mix engine plays. Slicing waits
+    until the requested frames have been rendered; ready() checks without waiting.
+    cancel() stops the render after its current block, leaving the rest silent.
+    """
+
+    def __init__(self, samples, speed=1.0, semitones=0.0):
+        self.speed = speed
+        self.semitones = semitones
+        self.samples = np.zeros((stretched_frames(samples, speed), samples.shape[1]), dtype=np.int16)
+        self.rendered = 0
+        self.complete = False
+        self.cancelled = False
+        self.error = None
+        self.condition = threading.Condition()
+        threading.Thread(target=self.render, args=(samples,), daemon=True).start()
+
+    def render(self, source):
+        try:
+            for block in stretch_blocks(source, self.speed, self.semitones):
+                if self.cancelled:
+                    return
+                end = self.rendered + len(block)
+                self.samples[self.rendered:end] = block
+                with self.condition:
+                    self.rendered = end
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.complete = not self.cancelled
+                self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            if not self.complete:
+                self.cancelled = True
+                self.condition.notify_all()
+
+    def ready(self, frame):
+        return self.complete or self.cancelled or self.rendered >= min(frame, len(self.samples))
+
+    @property
+    def shape(self):
+        return self.samples.shape
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, key):
+        stop = key.stop if isinstance(key, slice) and key.stop is not None else len(self.samples)
+        with self.condition:
+            self.condition.wait_for(lambda: self.ready(stop))
+        return self.samples[key]
+
+    def available(self, start, stop):
+        """The frames from start to stop rendered so far, which may be fewer than asked for."""
+        with self.condition:
+            return self.samples[start:max(start, min(stop, self.rendered))]
+
+
+def stretched_frames(samples, speed):
+    return int(round(len(samples) / speed))
+
+
+class StretchCache:
+    """Stretched stems keyed by stem file and (speed, semitones).
+
+    Renders of recent settings are kept up to max_bytes, so switching back to one reuses
+    it instead of stretching again. Room for a new setting is made before its renders
+    start by dropping (and stopping) the least recently used; a setting that wouldn't fit
+    at all is rendered without being kept.
+    """
+
+    def __init__(self, max_bytes=1024 ** 3):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # Every render started here that may still be running, cached or not
+        self.renders = []
+        self.lock = threading.Lock()
+
+    def get(self, stems, speed, semitones):
+        """Return stretched renders of [(path, samples), ...] at a setting, in the same order."""
+        # The mtime keeps a re-sliced stem from reusing its old render
+        keys = [(path, os.stat(path).st_mtime, speed, semitones) for path, _ in stems]
+        with self.lock:
+            for key in [key for key, stem in self.entries.items() if stem.cancelled]:
+                del self.entries[key]
+            needed = sum(stretched_frames(samples, speed) * samples.shape[1] * np.dtype(np.int16).itemsize
+                         for key, (_, samples) in zip(keys, stems) if key not in self.entries)
+            kept = sum(self.entries[key].samples.nbytes for key in keys if key in self.entries)
+            store = needed + kept <= self.max_bytes
+            if store:
+                total = sum(stem.samples.nbytes for stem in self.entries.values())
+                for key in list(self.entries):
+                    if total + needed <= self.max_bytes:
+                        break
+                    if key not in keys:
+                        evicted = self.entries.pop(key)
+                        evicted.cancel()
+                        total -= evicted.samples.nbytes
+
+            renders = []
+            for key, (_, samples) in zip(keys, stems):
+                stem = self.entries.get(key)
+                if stem is None:
+                    stem = StretchedStem(samples, speed, semitones)
+                    self.renders.append(stem)
+                    if store:
+                        self.entries[key] = stem
+                else:
+                    self.entries.move_to_end(key)
+                renders.append(stem)
+            self.renders = [stem for stem in self.renders if not (stem.complete or stem.cancelled)]
+        return renders
+
+    def cancel(self, keep=()):
+        """Stop every render still running except those in keep; stopped renders are forgotten."""
+        with self.lock:
+            for stem in self.renders:
+                if not any(stem is kept for kept in keep):
+                    stem.cancel()
+            self.renders = [stem for stem in self.renders if not (stem.complete or stem.cancelled)]
+            for key in [key for key, stem in self.entries.items() if stem.cancelled]:
+                del self.entries[key]